@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'portfolio.middleware.RequestMetricsMiddleware',  # Server-Timing header and request log
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -99,6 +100,43 @@ DATABASES = {
 }
 
 
+# Cache
+# Cached pages and settings are invalidated through version keys stored here, so
+# with several workers this must be a shared backend. The default is a cache
+# directory every worker on the host shares, which needs no extra service;
+# Redis or Memcached also work. The per-process cache is only for development
+# (DEBUG), and check portfolio.W001 warns when it is used with DEBUG off.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', (
+            'django.core.cache.backends.locmem.LocMemCache' if DEBUG
+            else 'django.core.cache.backends.filebased.FileBasedCache'
+        )),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'elsy-portfolio' if DEBUG else str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000')),
+        },
+    }
+}
+
+
+# Serve anonymous requests for the home, about and packages pages from the cache.
+PORTFOLIO_PAGE_CACHE = os.getenv('PAGE_CACHE', 'True') == 'True'
+
+# Contact and quote form submissions allowed per client IP and per email
+# address, as (burst, seconds to refill it); see portfolio.ratelimit. The
+# buckets live in the PORTFOLIO_RATE_LIMIT_CACHE cache, which must be Redis or
+# Memcached (check portfolio.W002), or the limiter stays off. Behind a
+# proxy, set PORTFOLIO_CLIENT_IP_HEADER to the META key it puts the client
+# address in, e.g. HTTP_X_REAL_IP on PythonAnywhere.
+PORTFOLIO_RATE_LIMITS = {
+    'ip': (5, 60 * 60),
+    'email': (3, 60 * 60),
+}
+PORTFOLIO_RATE_LIMIT_CACHE = os.getenv('RATE_LIMIT_CACHE', 'default')
+PORTFOLIO_CLIENT_IP_HEADER = os.getenv('PORTFOLIO_CLIENT_IP_HEADER', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -157,10 +195,49 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# collectstatic minifies, hashes and gzip/Brotli-compresses the static files;
+# WhiteNoise serves the hashed names as immutable for a year or more. Uploaded
+# images are stored once per distinct content, under their SHA-256 ('media');
+# run convert_media_storage after switching to move existing files over.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'media': {
+        'BACKEND': os.getenv('PORTFOLIO_MEDIA_STORAGE', 'portfolio.storage.ContentAddressedStorage'),
+    },
+    'staticfiles': {
+        'BACKEND': 'portfolio.storage.StaticFilesStorage',
+    },
+}
+
+# Uploaded media can be served by portfolio.media: set PORTFOLIO_MEDIA_ACCEL to
+# 'x-accel-redirect' (nginx, internal location at PORTFOLIO_MEDIA_ACCEL_PREFIX)
+# or 'x-sendfile' (Apache/lighttpd) to let the web server stream the files.
+# Without either, the route is only on under DEBUG, as streaming originals
+# through Python ties up a worker per download; in production the web server
+# should map MEDIA_URL to MEDIA_ROOT itself (check portfolio.W003).
+PORTFOLIO_MEDIA_ACCEL = os.getenv('PORTFOLIO_MEDIA_ACCEL', '')
+PORTFOLIO_SERVE_MEDIA = os.getenv('PORTFOLIO_SERVE_MEDIA', str(DEBUG or bool(PORTFOLIO_MEDIA_ACCEL))) == 'True'
+PORTFOLIO_MEDIA_ACCEL_PREFIX = os.getenv('PORTFOLIO_MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Browser cache lifetime of media files. Content-addressed originals never
+# change under their name and are always cached for a year, immutable.
+PORTFOLIO_MEDIA_MAX_AGE = 30 * 24 * 60 * 60
+
 # Ensure the directories exist
 os.makedirs(STATIC_ROOT, exist_ok=True)
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# Responsive images: derivative widths (px) and formats generated for every upload.
+# Formats the installed Pillow cannot encode are skipped; JPEG is always produced.
+PORTFOLIO_IMAGE_WIDTHS = [320, 640, 1024, 1600]
+PORTFOLIO_IMAGE_FORMATS = ['avif', 'webp']
+
+# Gallery uploads whose perceptual hash is within this many bits (of 64) of an
+# existing photo's are 'reject'ed or 'flag'ged as duplicates (portfolio.duplicates).
+PORTFOLIO_DUPLICATE_DISTANCE = 5
+PORTFOLIO_DUPLICATE_ACTION = os.getenv('PORTFOLIO_DUPLICATE_ACTION', 'reject')
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
@@ -173,6 +250,9 @@ ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@example.com')
 # Site ID
 SITE_ID = 1
 
+# Sitemaps are prebuilt into gzip files (see portfolio.sitemaps) on this domain.
+PORTFOLIO_SITE_DOMAIN = PYTHONANYWHERE_DOMAIN
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -222,6 +302,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'portfolio.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
         'django': {
             'handlers': ['console'],
             'level': 'INFO',
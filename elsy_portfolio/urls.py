@@ -4,19 +4,22 @@ URL configuration for elsy_portfolio project.
 The `urlpatterns` list routes URLs to views. For more information please see:
     https://docs.djangoproject.com/en/5.0/topics/http/urls/
 """
+import re
+from urllib.parse import urlparse
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.shortcuts import redirect
 from django.views.generic import TemplateView
 from django.http import HttpResponse
 from portfolio.views import (
     HomeView, AboutView, ContactView, 
     PackageListView, QuoteRequestView,
-    custom_404_view, custom_500_view
+    custom_404_view, custom_500_view, sitemap_view
 )
 from portfolio.custom_admin import portfolio_admin_site
+from portfolio.media import serve_media
 
 # Admin site configuration
 admin.site.site_header = 'Elsy Portfolio Admin'
@@ -52,15 +55,22 @@ urlpatterns = [
         template_name='robots.txt', 
         content_type='text/plain'
     )),
+    path('sitemap.xml', sitemap_view, name='sitemap'),
+    re_path(r'^(?P<filename>sitemap-[a-z]+-\d+\.xml\.gz)$', sitemap_view, name='sitemap_section'),
     
     # Favicon (return 404 to avoid template errors)
     path('favicon.ico', lambda request: HttpResponse(status=404)),
 ]
 
-# Serve media files in development
+# Uploaded media, with ranges, ETags and optional X-Accel-Redirect/X-Sendfile
+# offload (see portfolio.media). Off by default in production unless the web
+# server streams the files; otherwise it maps MEDIA_URL to MEDIA_ROOT itself.
+if getattr(settings, 'PORTFOLIO_SERVE_MEDIA', settings.DEBUG) and not urlparse(settings.MEDIA_URL).netloc:
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$', serve_media, name='media'),
+    ]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    
     # Debug toolbar
     try:
         import debug_toolbar
@@ -1,9 +1,26 @@
-from django.contrib import admin
+import json
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.utils.html import format_html
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from .models import (
     PortfolioItem, PortfolioImage, Package, 
-    QuoteRequest, ContactMessage, GalleryImage, ProfileImage, SiteSettings, Service
+    QuoteRequest, ContactMessage, GalleryImage, ProfileImage, SiteSettings, Service,
+    OutboxEmail
 )
+from . import duplicates
+from .images import describe_image, perceptual_hash
+from .signals import invalidate_model_caches
+from .uploads import UploadError, complete_chunked_uploads, create_gallery_images, write_chunk
 
 
 class PortfolioImageInline(admin.TabularInline):
@@ -13,15 +30,44 @@ class PortfolioImageInline(admin.TabularInline):
     classes = ('collapse',)
 
 
+class GalleryImageAdminForm(forms.ModelForm):
+    """Rejects, or flags, a new photo that duplicates one already in the gallery."""
+
+    class Meta:
+        model = GalleryImage
+        fields = '__all__'
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not image or 'image' not in self.changed_data:
+            return image
+        try:
+            image.seek(0)
+            image_hash = perceptual_hash(image)
+        except (OSError, ValueError):
+            # ImageField has already accepted the file; leave it to the pipeline.
+            return image
+        finally:
+            image.seek(0)
+
+        match = duplicates.find_duplicate(image_hash, exclude=self.instance.pk)
+        if match is not None and duplicates.get_action() == 'reject':
+            raise forms.ValidationError(duplicates.describe_duplicate(match.pk, match.title))
+        self.instance.image_hash = image_hash
+        self.instance.duplicate_of = match
+        return image
+
+
 class GalleryImageAdmin(admin.ModelAdmin):
+    form = GalleryImageAdminForm
     list_display = ('title', 'thumbnail_preview', 'is_active', 'order', 'created_at')
-    list_filter = ('is_active', 'created_at')
+    list_filter = ('is_active', ('duplicate_of', admin.EmptyFieldListFilter), 'created_at')
     list_editable = ('is_active', 'order')
     search_fields = ('title', 'alt_text', 'caption')
     ordering = ('order', '-created_at')
     actions = ['activate_images', 'deactivate_images']
-    fields = ('title', 'image', 'image_preview', 'alt_text', 'caption', 'order', 'is_active')
-    readonly_fields = ('image_preview',)
+    fields = ('title', 'image', 'image_preview', 'duplicate_of', 'alt_text', 'caption', 'order', 'is_active')
+    readonly_fields = ('image_preview', 'duplicate_of')
     
     def thumbnail_preview(self, obj):
         if obj.image:
@@ -39,8 +85,9 @@ class GalleryImageAdmin(admin.ModelAdmin):
         if obj.image:
             try:
                 return format_html(
-                    '<img src="{}" style="max-width: 300px; max-height: 300px; object-fit: contain;" />',
-                    obj.image.url
+                    '<img src="{}" style="max-width: 300px; max-height: 300px; object-fit: contain;" /><br>{}',
+                    obj.image.url,
+                    describe_image(obj, 'image'),
                 )
             except:
                 return "Image not found"
@@ -49,13 +96,106 @@ class GalleryImageAdmin(admin.ModelAdmin):
     
     def activate_images(self, request, queryset):
         queryset.update(is_active=True)
+        invalidate_model_caches(self.model)
         self.message_user(request, f"{queryset.count()} images activated.")
     activate_images.short_description = "Activate selected images"
     
     def deactivate_images(self, request, queryset):
         queryset.update(is_active=False)
+        invalidate_model_caches(self.model)
         self.message_user(request, f"{queryset.count()} images deactivated.")
     deactivate_images.short_description = "Deactivate selected images"
+    
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path('bulk-upload/', self.admin_site.admin_view(self.bulk_upload_view),
+                 name='%s_%s_bulk_upload' % info),
+            path('bulk-upload/chunk/', self.admin_site.admin_view(self.bulk_upload_chunk_view),
+                 name='%s_%s_bulk_upload_chunk' % info),
+            path('bulk-upload/complete/', self.admin_site.admin_view(self.bulk_upload_complete_view),
+                 name='%s_%s_bulk_upload_complete' % info),
+        ] + super().get_urls()
+    
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['bulk_upload_url'] = self._bulk_upload_url('bulk_upload')
+        return super().changelist_view(request, extra_context)
+    
+    def _bulk_upload_url(self, name):
+        info = self.opts.app_label, self.opts.model_name
+        return reverse('%s:%s_%s_%s' % ((self.admin_site.name,) + info + (name,)))
+    
+    @method_decorator(csrf_exempt)
+    def bulk_upload_view(self, request):
+        """Upload many photos at once, streaming every file to disk."""
+        # Upload handlers must be swapped before the CSRF check reads request.POST
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return self._bulk_upload_view(request)
+    
+    @method_decorator(csrf_protect)
+    def _bulk_upload_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        
+        if request.method == 'POST':
+            results = create_gallery_images([(f.name, f) for f in request.FILES.getlist('images')])
+            created = [result for result in results if 'id' in result]
+            if created:
+                self.message_user(request, f"{len(created)} photos were successfully uploaded.")
+            for result in results:
+                if 'error' in result:
+                    self.message_user(request, f"{result['name']}: {result['error']}", messages.ERROR)
+                elif 'duplicate_of' in result:
+                    self.message_user(
+                        request,
+                        f"{result['name']}: flagged as a duplicate of #{result['duplicate_of']}.",
+                        messages.WARNING,
+                    )
+            return redirect(self._bulk_upload_url('changelist'))
+        
+        request.current_app = self.admin_site.name
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Upload Multiple Photos',
+            'opts': self.opts,
+            'chunk_url': self._bulk_upload_url('bulk_upload_chunk'),
+            'complete_url': self._bulk_upload_url('bulk_upload_complete'),
+            'changelist_url': self._bulk_upload_url('changelist'),
+        }
+        return TemplateResponse(request, 'admin/bulk_upload.html', context)
+    
+    def bulk_upload_chunk_view(self, request):
+        """Receive one chunk of a photo, identified by X-Upload-Id and Content-Range."""
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        try:
+            received = write_chunk(
+                request.headers.get('X-Upload-Id'),
+                request.headers.get('Content-Range'),
+                request,
+            )
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'received': received})
+    
+    def bulk_upload_complete_view(self, request):
+        """Create gallery images from finished chunked uploads and report per-file results."""
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        try:
+            uploads = json.loads(request.body)['uploads']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Invalid request.'}, status=400)
+        try:
+            results = complete_chunked_uploads(uploads)
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'results': results})
 
 
 class ProfileImageAdmin(admin.ModelAdmin):
@@ -83,8 +223,9 @@ class ProfileImageAdmin(admin.ModelAdmin):
         if obj.image:
             try:
                 return format_html(
-                    '<img src="{}" style="max-width: 300px; max-height: 300px; object-fit: contain;" />',
-                    obj.image.url
+                    '<img src="{}" style="max-width: 300px; max-height: 300px; object-fit: contain;" /><br>{}',
+                    obj.image.url,
+                    describe_image(obj, 'image'),
                 )
             except:
                 return "Image not found"
@@ -115,8 +256,9 @@ class PortfolioItemAdmin(admin.ModelAdmin):
         if obj.main_image:
             try:
                 return format_html(
-                    '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" />',
-                    obj.main_image.url
+                    '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" /><br>{}',
+                    obj.main_image.url,
+                    describe_image(obj, 'main_image'),
                 )
             except:
                 return "Image not found"
@@ -126,6 +268,7 @@ class PortfolioItemAdmin(admin.ModelAdmin):
 
 class PortfolioImageAdmin(admin.ModelAdmin):
     list_display = ('thumbnail_preview', 'portfolio_item', 'caption', 'order')
+    list_select_related = ('portfolio_item',)
     list_display_links = ('thumbnail_preview', 'portfolio_item')
     list_editable = ('order',)
     list_filter = ('portfolio_item__category',)
@@ -166,6 +309,7 @@ class PackageAdmin(admin.ModelAdmin):
 
 class QuoteRequestAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'package', 'is_contacted', 'created_at')
+    list_select_related = ('package',)
     list_filter = ('is_contacted', 'created_at', 'package__category')
     search_fields = ('name', 'email', 'package__name', 'message')
     list_editable = ('is_contacted',)
@@ -235,6 +379,7 @@ class ServiceAdmin(admin.ModelAdmin):
 
 class SiteSettingsAdmin(admin.ModelAdmin):
     list_display = ('site_name', 'hero_title', 'hero_subtitle', 'main_profile_image', 'updated_at')
+    list_select_related = ('main_profile_image',)
     fieldsets = (
         ('🏠 Site Information', {
             'fields': ('site_name', 'site_description'),
@@ -276,6 +421,31 @@ class SiteSettingsAdmin(admin.ModelAdmin):
         return super().changelist_view(request, extra_context)
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'last_error')
+    readonly_fields = (
+        'subject', 'body', 'from_email', 'recipients', 'attempts',
+        'last_error', 'sent_at', 'created_at', 'updated_at'
+    )
+    actions = ['retry_emails']
+    list_per_page = 20
+    
+    def has_add_permission(self, request):
+        # Emails are only queued by the site itself
+        return False
+    
+    def retry_emails(self, request, queryset):
+        updated = queryset.exclude(status=OutboxEmail.SENT).update(
+            status=OutboxEmail.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} emails queued for another attempt.")
+    retry_emails.short_description = "Retry selected emails"
+
+
 # Register models with default admin site
 admin.site.register(Package, PackageAdmin)
 admin.site.register(QuoteRequest, QuoteRequestAdmin)
@@ -284,3 +454,4 @@ admin.site.register(GalleryImage, GalleryImageAdmin)
 admin.site.register(ProfileImage, ProfileImageAdmin)
 admin.site.register(Service, ServiceAdmin)
 admin.site.register(SiteSettings, SiteSettingsAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
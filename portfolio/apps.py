@@ -1,6 +1,11 @@
-from django.apps import AppConfig
-
-
-class PortfolioConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'portfolio'
+from django.apps import AppConfig
+
+
+class PortfolioConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'portfolio'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,273 @@
+"""
+In-process benchmarks for the portfolio views.
+
+``seed()`` builds a deterministic dataset, ``run()`` drives every public and
+admin URL through the test client and measures latency, queries, response
+size and peak memory, and ``compare()`` checks a run against a stored
+baseline. The ``bench`` management command ties them together.
+"""
+import io
+import math
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+from PIL import Image
+
+from .custom_admin import portfolio_admin_site
+from .images import process_image
+from .models import (
+    ContactMessage, GalleryImage, Package, PortfolioImage, PortfolioItem, ProfileImage,
+    QuoteRequest, Service, SiteSettings,
+)
+
+# Default regression thresholds for ``compare()``.
+LATENCY_THRESHOLD = 0.20
+MEMORY_THRESHOLD = 0.25
+QUERY_THRESHOLD = 0
+
+WORDS = (
+    'editorial fashion portrait studio campaign lifestyle beauty brand runway '
+    'street summer launch product story reel natural light colour session'
+).split()
+
+
+def _image(name, size, seed):
+    """Save a deterministic JPEG to default storage, generate its derivatives and return its name."""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    process_image(GalleryImage(image=name).image)
+    return name
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+@transaction.atomic
+def seed(scale=1, random_seed=0):
+    """
+    Fill the (empty) database with a deterministic dataset.
+
+    ``scale`` multiplies the number of gallery images, portfolio items and
+    their photos, packages and messages. Rows of one kind share a single
+    image file, which keeps seeding fast without changing what the views
+    render. Runs in one transaction, so caches and sitemaps are rebuilt once.
+    """
+    rng = random.Random(random_seed)
+
+    gallery_image = _image('bench/gallery.jpg', (1200, 1600), 1)
+    portfolio_image = _image('bench/portfolio.jpg', (1600, 1067), 2)
+    profile_image = _image('bench/profile.jpg', (800, 800), 3)
+
+    profile = ProfileImage.objects.create(title='Profile', image=profile_image)
+    SiteSettings.objects.create(main_profile_image=profile, email='bench@example.com')
+
+    for i in range(6):
+        Service.objects.create(name=f'{_text(rng, 2).title()} {i}', order=i)
+
+    for i in range(8 * scale):
+        GalleryImage.objects.create(
+            title=_text(rng, 3).title(),
+            image=gallery_image,
+            caption=_text(rng, 8),
+            order=i,
+            is_active=i % 8 != 7,
+        )
+
+    for i in range(10 * scale):
+        item = PortfolioItem.objects.create(
+            title=f'{_text(rng, 3).title()} {i}',
+            description=_text(rng, 60),
+            category=rng.choice([PortfolioItem.DIGITAL, PortfolioItem.MODELLING]),
+            main_image=portfolio_image,
+            is_featured=i % 10 == 0,
+            published=i % 10 != 9,
+        )
+        for order in range(2 * scale):
+            PortfolioImage.objects.create(portfolio_item=item, image=portfolio_image, order=order)
+
+    packages = []
+    for i in range(2 * scale):
+        packages.append(Package.objects.create(
+            name=f'{_text(rng, 2).title()} {i}',
+            description=_text(rng, 30),
+            category=rng.choice([Package.DIGITAL, Package.MODELLING]),
+        ))
+
+    for i in range(10 * scale):
+        ContactMessage.objects.create(
+            name=f'Client {i}',
+            email=f'client{i}@example.com',
+            subject=_text(rng, 4),
+            message=_text(rng, 40),
+            is_responded=i % 3 == 0,
+        )
+        QuoteRequest.objects.create(
+            package=rng.choice(packages),
+            name=f'Client {i}',
+            email=f'client{i}@example.com',
+            message=_text(rng, 30),
+        )
+
+    return get_user_model().objects.create_superuser('bench', 'bench@example.com', None)
+
+
+def get_urls():
+    """
+    Return ``(name, url, as_admin)`` for every public page and admin page to benchmark.
+
+    Admin pages cover each admin site's index plus the changelist and the
+    first change form of every registered model.
+    """
+    urls = [
+        ('home', reverse('home'), False),
+        ('about', reverse('about'), False),
+        ('packages', reverse('packages'), False),
+        ('contact', reverse('contact'), False),
+    ]
+    try:
+        urls.append(('portfolio:list', reverse('portfolio:list'), False))
+        urls.append(('portfolio:list:search', reverse('portfolio:list') + '?q=fashion', False))
+        item = PortfolioItem.objects.filter(published=True).order_by('created_at', 'id').first()
+        if item is not None:
+            urls.append(('portfolio:detail', item.get_absolute_url(), False))
+    except NoReverseMatch:
+        # The portfolio pages are not routed on this site.
+        pass
+
+    for site in (admin.site, portfolio_admin_site):
+        urls.append((f'{site.name}:index', reverse(f'{site.name}:index'), True))
+        for model in site._registry:
+            opts = model._meta
+            prefix = f'{site.name}:{opts.app_label}_{opts.model_name}'
+            urls.append((f'{prefix}_changelist', reverse(f'{prefix}_changelist'), True))
+            obj = model._default_manager.order_by('pk').first()
+            if obj is not None:
+                urls.append((f'{prefix}_change', reverse(f'{prefix}_change', args=[obj.pk]), True))
+    return urls
+
+
+def percentile(values, percent):
+    """Return the ``percent`` percentile of ``values`` by nearest rank."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def measure(client, url, iterations=20, warmup=2):
+    """
+    Request ``url`` repeatedly and return its statistics.
+
+    Timings are taken without instrumentation; the query count and peak
+    memory come from one extra request each.
+    """
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Each request resets the query log, so count before the next one.
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    query_count = len(queries)
+
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': query_count,
+        'bytes': len(response.content),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(user, iterations=20, warmup=2, only=None, log=None):
+    """
+    Benchmark every URL from ``get_urls()`` and return the report dict.
+
+    ``only`` restricts the run to names containing any of its substrings.
+    The cache is cleared before each URL so warm-up starts from cold.
+    """
+    anonymous = Client()
+    staff = Client()
+    staff.force_login(user)
+
+    results = {}
+    for name, url, as_admin in get_urls():
+        if only and not any(part in name for part in only):
+            continue
+        cache.clear()
+        results[name] = measure(staff if as_admin else anonymous, url, iterations, warmup)
+        if log:
+            log(name, results[name])
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, latency=LATENCY_THRESHOLD, memory=MEMORY_THRESHOLD, queries=QUERY_THRESHOLD):
+    """
+    Return a list of regression messages for ``report`` against ``baseline``.
+
+    ``latency`` and ``memory`` are allowed relative increases of p95 latency
+    and peak memory (0.2 = 20%); ``queries`` is the number of extra queries
+    tolerated. URLs missing from either report are ignored.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        if result['p95_ms'] > previous['p95_ms'] * (1 + latency):
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.1f}ms vs baseline {previous['p95_ms']:.1f}ms"
+            )
+        if result['queries'] > previous['queries'] + queries:
+            regressions.append(
+                f"{name}: {result['queries']} queries vs baseline {previous['queries']}"
+            )
+        if result['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + memory):
+            regressions.append(
+                f"{name}: peak memory {result['peak_memory_kb']:.0f}KB "
+                f"vs baseline {previous['peak_memory_kb']:.0f}KB"
+            )
+        if result['status'] != previous['status']:
+            regressions.append(f"{name}: status {result['status']} vs baseline {previous['status']}")
+    return regressions
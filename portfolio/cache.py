@@ -0,0 +1,354 @@
+"""
+Caching helpers for the portfolio app.
+
+Cached data is grouped into namespaces, each with a version number kept in
+the shared Django cache. Model signals bump a namespace's version whenever
+the rows it is built from change, which invalidates every worker's copy at
+once without anyone having to guess a TTL.
+"""
+import hashlib
+import os
+import time
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.template.utils import get_app_template_dirs
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag, urlencode
+
+from .metrics import record_cache
+
+VERSION_KEY = 'portfolio:version:{}'
+PAGE_KEY = 'portfolio:page:{}:{}'
+VALIDATORS_KEY = 'portfolio:validators:{}:{}'
+
+# Stale page versions are never read again; this only bounds how long they
+# occupy the cache before being reclaimed.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Per-process copies of cached values, as {namespace: (version, value)}.
+_local = {}
+
+_release = None
+
+
+def get_version(namespace):
+    """Return the current version of ``namespace``, initialising it if needed."""
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never repeats.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate everything cached under ``namespace``."""
+    key = VERSION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def invalidate(*namespaces):
+    """
+    Bump ``namespaces`` now and again once the current transaction commits.
+
+    The second bump stops another worker from caching rows it read before
+    our changes became visible.
+    """
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_local(namespace, build):
+    """
+    Return the per-process value for ``namespace``, rebuilding it with
+    ``build()`` when the shared version has moved on.
+    """
+    version = get_version(namespace)
+    cached = _local.get(namespace)
+    if cached is not None and cached[0] == version:
+        record_cache(hit=True)
+        return cached[1]
+    record_cache(hit=False)
+    value = build()
+    _local[namespace] = (version, value)
+    return value
+
+
+def get_shared(namespace, build, timeout=None):
+    """
+    Return the value for ``namespace`` from the shared cache, building and
+    storing it with ``build()`` on a miss. ``timeout`` additionally caps how
+    long the value may be served.
+    """
+    key = f'portfolio:{namespace}:{get_version(namespace)}'
+    value = cache.get(key)
+    record_cache(hit=value is not None)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _load_site_settings():
+    from .models import ProfileImage, SiteSettings
+
+    site_settings = SiteSettings.objects.select_related('main_profile_image').first()
+
+    # Get profile image from site settings first, fallback to active profile image
+    if site_settings and site_settings.main_profile_image:
+        profile_image = site_settings.main_profile_image
+    else:
+        profile_image = ProfileImage.objects.filter(is_active=True).first()
+    return site_settings, profile_image
+
+
+def get_site_settings():
+    """Return the ``SiteSettings`` singleton (or ``None``) from the cache."""
+    return get_local('site_settings', _load_site_settings)[0]
+
+
+def get_profile_image():
+    """Return the profile image to show across the site, resolved alongside the settings."""
+    return get_local('site_settings', _load_site_settings)[1]
+
+
+def _load_services():
+    from .models import Service
+
+    services = {}
+    for name in Service.objects.filter(is_active=True).order_by('order', 'name').values_list('name', flat=True):
+        services.setdefault(name.lower().replace(' ', '_'), name)
+    return services
+
+
+def get_services():
+    """Return active services as an ordered ``{slug: name}`` dict, from the shared cache."""
+    return get_shared('services', _load_services)
+
+
+def _load_package_catalogue():
+    from .models import Package
+
+    labels = dict(Package.CATEGORY_CHOICES)
+    groups = {category: [] for category in labels}
+    for package in Package.objects.filter(is_active=True).order_by('category', 'name'):
+        groups.setdefault(package.category, []).append(package)
+    return [
+        {'category': category, 'label': labels.get(category, category), 'packages': packages}
+        for category, packages in groups.items()
+    ]
+
+
+def get_package_catalogue():
+    """
+    Return active packages grouped by category, from the shared cache.
+
+    Each entry is a ``{'category', 'label', 'packages'}`` dict, in the order
+    of ``Package.CATEGORY_CHOICES``; categories without packages are kept
+    with an empty list.
+    """
+    return get_shared('packages', _load_package_catalogue)
+
+
+def page_cache_key(request, version, params=()):
+    """
+    Return the cache key for ``request``'s page at content ``version``.
+
+    Only the query ``params`` the view reads are part of the key, so other
+    query strings (tracking tags, cache busters) share the page's entry
+    instead of each filling the cache with a copy.
+    """
+    query = urlencode(
+        [(name, request.GET.getlist(name)) for name in sorted(params) if name in request.GET],
+        doseq=True,
+    )
+    url = hashlib.md5(f'{request.build_absolute_uri(request.path)}?{query}'.encode()).hexdigest()
+    return PAGE_KEY.format(version, url)
+
+
+class PageCacheMixin:
+    """
+    Serve anonymous GET requests for a view from the page cache.
+
+    Cached pages are keyed on the ``pages`` content version, which the model
+    signals bump whenever anything the public pages render changes, so a
+    cached page is never stale. Requests from logged in users, requests with
+    pending flash messages and responses that set cookies or use a CSRF token
+    always bypass the cache. Pages are keyed on their path and the query
+    parameters listed in ``page_cache_params``, which must name every one
+    the view reads. Set ``PORTFOLIO_PAGE_CACHE = False`` to disable.
+    """
+    page_cache_namespace = 'pages'
+    page_cache_params = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache_key(request, get_version(self.page_cache_namespace), self.page_cache_params)
+        cached = cache.get(key)
+        record_cache(hit=cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().dispatch(request, *args, **kwargs)
+
+        def store(response):
+            if (
+                response.status_code == 200
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            ):
+                cache.set(key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def is_page_cacheable(self, request):
+        return (
+            getattr(settings, 'PORTFOLIO_PAGE_CACHE', True)
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and not len(get_messages(request))
+        )
+
+
+def get_release():
+    """
+    Return an identifier for the deployed templates, mixed into ETags so a
+    deploy that only changes templates still invalidates browser caches.
+
+    Defaults to the newest template modification time; set
+    ``PORTFOLIO_RELEASE`` (e.g. to the commit hash) to override it.
+    """
+    global _release
+    if _release is None:
+        release = getattr(settings, 'PORTFOLIO_RELEASE', None)
+        if not release:
+            directories = list(get_app_template_dirs('templates'))
+            for engine in settings.TEMPLATES:
+                directories.extend(engine.get('DIRS', []))
+            newest = 0
+            for directory in directories:
+                for root, dirs, files in os.walk(directory):
+                    for name in files:
+                        newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            release = str(int(newest))
+        _release = release
+    return _release
+
+
+def get_content_state(models):
+    """
+    Return ``(last_modified, fingerprint)`` for the rows of ``models``.
+
+    ``last_modified`` is the newest ``updated_at`` across them as a Unix
+    timestamp (``None`` if they are all empty); ``fingerprint`` lists each
+    model's newest ``updated_at``. Both come from one ``UNION ALL`` query
+    whose ``MAX()`` subqueries each read the end of an ``updated_at`` index.
+    Deletions do not show here; the namespace version covers them.
+    """
+    quote = connection.ops.quote_name
+    sql = ' UNION ALL '.join(
+        f"SELECT MAX({quote(model._meta.get_field('updated_at').column)}) FROM {quote(model._meta.db_table)}"
+        for model in models
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        rows = [newest for newest, in cursor.fetchall()]
+
+    last_modified = None
+    for newest in rows:
+        if isinstance(newest, str):
+            # SQLite returns the raw column text, stored in UTC.
+            newest = parse_datetime(newest)
+        if newest is None:
+            continue
+        if timezone.is_naive(newest):
+            newest = newest.replace(tzinfo=dt_timezone.utc)
+        last_modified = max(last_modified or 0, int(newest.timestamp()))
+    fingerprint = ';'.join(str(newest) for newest in rows)
+    return last_modified, fingerprint
+
+
+class ConditionalGetMixin:
+    """
+    Answer repeat GET requests for an unchanged page with ``304 Not Modified``.
+
+    ``conditional_models`` lists the models whose rows the page renders. Its
+    ``Last-Modified`` is their newest ``updated_at``, and its ETag also
+    covers the deployed templates and the version of
+    ``conditional_namespace``, which the model signals bump whenever those
+    rows are saved or deleted. Validators are cached under that version, so
+    checking them usually costs no query. Only requests that ``PageCacheMixin`` would cache are
+    eligible. Set ``PORTFOLIO_CONDITIONAL_GET = False`` to disable.
+    """
+    conditional_models = ()
+    conditional_namespace = 'pages'
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_conditional(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        last_modified, etag = self.get_validators()
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().dispatch(request, *args, **kwargs)
+
+        def add_validators(response):
+            if response.status_code == 200 and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                # Let browsers keep the page, but revalidate it on every visit.
+                patch_cache_control(response, no_cache=True)
+
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(add_validators)
+        else:
+            add_validators(response)
+        return response
+
+    def get_validators(self):
+        """Return ``(last_modified, etag)`` for the page, from the cache when possible."""
+        version = get_version(self.conditional_namespace)
+        key = VALIDATORS_KEY.format(self.__class__.__name__, version)
+        validators = cache.get(key)
+        record_cache(hit=validators is not None)
+        if validators is None:
+            last_modified, fingerprint = get_content_state(self.conditional_models)
+            digest = hashlib.md5(
+                f'{self.__class__.__name__}:{get_release()}:{version}:{fingerprint}'.encode()
+            ).hexdigest()
+            validators = (last_modified, quote_etag(digest))
+            cache.set(key, validators, PAGE_CACHE_TIMEOUT)
+        return validators
+
+    def is_conditional(self, request):
+        return (
+            getattr(settings, 'PORTFOLIO_CONDITIONAL_GET', True)
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and not len(get_messages(request))
+        )
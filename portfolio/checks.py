@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when production runs on a per-process cache. Cached pages are
+    invalidated by bumping version keys in the default cache; with a
+    per-process cache only the worker that handled the save sees the bump,
+    and the others keep serving stale pages.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or backend not in LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is not shared between worker processes, so "
+            "workers keep serving cached pages after the content changes.",
+            hint=(
+                "Set CACHE_BACKEND to a shared backend, e.g. "
+                "django.core.cache.backends.filebased.FileBasedCache with CACHE_LOCATION "
+                "set to a directory, or Redis or Memcached."
+            ),
+            id='portfolio.W001',
+        )
+    ]
+
+
+@register(Tags.caches)
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Warn when form rate limiting is configured but off for want of a suitable cache."""
+    from . import ratelimit
+
+    if not ratelimit.get_limits() or ratelimit.is_enabled():
+        return []
+    alias = ratelimit.get_cache_alias()
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return [
+        Warning(
+            f"PORTFOLIO_RATE_LIMITS is set but the contact and quote forms are not rate limited: "
+            f"the {alias!r} cache ({backend}) does not update counters atomically across workers.",
+            hint=(
+                "Use Redis or Memcached for that cache, or point PORTFOLIO_RATE_LIMIT_CACHE at "
+                "a CACHES entry that does."
+            ),
+            id='portfolio.W002',
+        )
+    ]
+
+
+@register()
+def check_media_offload(app_configs, **kwargs):
+    """Warn when production streams uploaded media through Django workers."""
+    from .media import get_accel_mode
+
+    if settings.DEBUG or not getattr(settings, 'PORTFOLIO_SERVE_MEDIA', False) or get_accel_mode():
+        return []
+    return [
+        Warning(
+            "PORTFOLIO_SERVE_MEDIA is on without PORTFOLIO_MEDIA_ACCEL, so every uploaded image "
+            "and video is streamed through a Django worker.",
+            hint=(
+                "Set PORTFOLIO_MEDIA_ACCEL to x-accel-redirect or x-sendfile, or turn "
+                "PORTFOLIO_SERVE_MEDIA off and map MEDIA_URL to MEDIA_ROOT in the web server."
+            ),
+            id='portfolio.W003',
+        )
+    ]
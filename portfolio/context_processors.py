@@ -1,8 +1,8 @@
-from .models import SiteSettings
+from .cache import get_site_settings
 
 def site_settings(request):
     """Context processor to make site settings available in all templates."""
-    settings = SiteSettings.objects.first()
+    settings = get_site_settings()
     return {
         'site_settings': settings
     }
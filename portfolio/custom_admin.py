@@ -6,10 +6,17 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
+from django.db.models import Count, Max, Q
 from .models import (
     GalleryImage, ProfileImage, ContactMessage, SiteSettings
 )
 from .admin import GalleryImageAdmin, ProfileImageAdmin
+from .signals import invalidate_model_caches
+from .cache import get_shared
+
+# The dashboard cache is invalidated by model signals; the timeout is a
+# backstop for changes made outside the ORM.
+DASHBOARD_CACHE_TIMEOUT = 60
 
 
 class PortfolioAdminSite(AdminSite):
@@ -32,19 +39,31 @@ class PortfolioAdminSite(AdminSite):
         extra_context = extra_context or {}
         
         # Get statistics for dashboard
-        extra_context.update({
-            'gallery_count': GalleryImage.objects.count(),
-            'profile_count': ProfileImage.objects.count(),
-            'message_count': ContactMessage.objects.filter(is_responded=False).count(),
-            'active_gallery_count': GalleryImage.objects.filter(is_active=True).count(),
-            'active_profile_count': ProfileImage.objects.filter(is_active=True).count(),
-            'recent_messages': ContactMessage.objects.order_by('-created_at')[:5],
-            'latest_gallery': GalleryImage.objects.order_by('-created_at').first(),
-            'latest_profile': ProfileImage.objects.order_by('-created_at').first(),
-            'latest_message': ContactMessage.objects.order_by('-created_at').first(),
-        })
+        extra_context.update(get_shared('dashboard', self.get_dashboard_stats, DASHBOARD_CACHE_TIMEOUT))
         
         return super().index(request, extra_context)
+    
+    def get_dashboard_stats(self):
+        """
+        Collect the dashboard statistics with one conditional aggregate per
+        table plus the recent messages list.
+        """
+        stats = GalleryImage.objects.aggregate(
+            gallery_count=Count('id'),
+            active_gallery_count=Count('id', filter=Q(is_active=True)),
+            latest_gallery=Max('created_at'),
+        )
+        stats.update(ProfileImage.objects.aggregate(
+            profile_count=Count('id'),
+            active_profile_count=Count('id', filter=Q(is_active=True)),
+            latest_profile=Max('created_at'),
+        ))
+        stats.update(ContactMessage.objects.aggregate(
+            message_count=Count('id', filter=Q(is_responded=False)),
+            latest_message=Max('created_at'),
+        ))
+        stats['recent_messages'] = list(ContactMessage.objects.order_by('-created_at')[:5])
+        return stats
 
 
 # Create custom admin site instance
@@ -61,11 +80,13 @@ class CustomGalleryImageAdmin(GalleryImageAdmin):
     
     def activate_images(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_model_caches(self.model)
         self.message_user(request, f'{updated} images were successfully activated.')
     activate_images.short_description = "Activate selected images"
     
     def deactivate_images(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_model_caches(self.model)
         self.message_user(request, f'{updated} images were successfully deactivated.')
     deactivate_images.short_description = "Deactivate selected images"
     
@@ -92,11 +113,13 @@ class CustomProfileImageAdmin(ProfileImageAdmin):
     
     def activate_images(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_model_caches(self.model)
         self.message_user(request, f'{updated} profile images were successfully activated.')
     activate_images.short_description = "Activate selected profile images"
     
     def deactivate_images(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_model_caches(self.model)
         self.message_user(request, f'{updated} profile images were successfully deactivated.')
     deactivate_images.short_description = "Deactivate selected profile images"
     
@@ -117,6 +140,7 @@ class CustomSiteSettingsAdmin(admin.ModelAdmin):
     """Custom Site Settings Admin for client-friendly configuration"""
     change_form_template = 'custom_admin/change_form.html'
     list_display = ('site_name', 'hero_title', 'hero_subtitle', 'main_profile_image', 'updated_at')
+    list_select_related = ('main_profile_image',)
     fieldsets = (
         ('🏠 Site Information', {
             'fields': ('site_name', 'site_description'),
@@ -0,0 +1,159 @@
+"""
+Near-duplicate detection for gallery photos.
+
+Every gallery image stores a 64-bit perceptual hash (see
+``portfolio.images.perceptual_hash``). Two photos whose hashes differ in at
+most ``PORTFOLIO_DUPLICATE_DISTANCE`` bits are treated as the same shot,
+even when one was resized or re-exported.
+
+Hashes are searched with a BK-tree: each child sits under its distance to
+its parent, so by the triangle inequality a search only descends into the
+children that can hold a match, instead of comparing against every photo.
+
+``PORTFOLIO_DUPLICATE_ACTION`` decides what happens to a new upload that
+matches an existing photo: ``'reject'`` it, or ``'flag'`` it by setting
+``duplicate_of`` and keep it.
+"""
+from django.conf import settings
+
+DEFAULT_DISTANCE = 5
+
+ACTIONS = ('reject', 'flag')
+
+
+def get_distance():
+    return getattr(settings, 'PORTFOLIO_DUPLICATE_DISTANCE', DEFAULT_DISTANCE)
+
+
+def get_action():
+    action = getattr(settings, 'PORTFOLIO_DUPLICATE_ACTION', 'reject')
+    if action not in ACTIONS:
+        raise ValueError(f"PORTFOLIO_DUPLICATE_ACTION must be one of {', '.join(ACTIONS)}, not {action!r}.")
+    return action
+
+
+def hamming(a, b):
+    """Number of differing bits between two integer hashes."""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """A BK-tree of ``(hash, item)`` pairs, with hashes as integers."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, item):
+        node = (value, item, {})
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        parent = self.root
+        while True:
+            distance = hamming(value, parent[0])
+            child = parent[2].get(distance)
+            if child is None:
+                parent[2][distance] = node
+                return
+            parent = child
+
+    def search(self, value, max_distance):
+        """Return ``(distance, item)`` for every entry within ``max_distance``, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, item))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+    def nearest(self, value, max_distance):
+        """Return the closest ``(distance, item)`` within ``max_distance``, or ``None``."""
+        found = self.search(value, max_distance)
+        return found[0] if found else None
+
+
+def load_tree(exclude=None):
+    """Return a BK-tree of every hashed gallery image, with ``(pk, title)`` items."""
+    from .models import GalleryImage
+
+    queryset = GalleryImage.objects.exclude(image_hash='')
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    tree = BKTree()
+    for pk, title, image_hash in queryset.order_by('pk').values_list('pk', 'title', 'image_hash').iterator():
+        tree.add(int(image_hash, 16), (pk, title))
+    return tree
+
+
+def find_duplicate(image_hash, exclude=None):
+    """
+    Return the ``GalleryImage`` that ``image_hash`` most likely duplicates,
+    or ``None``. Exact matches are answered from the index; only otherwise
+    are the stored hashes loaded into a BK-tree.
+    """
+    from .models import GalleryImage
+
+    queryset = GalleryImage.objects.all()
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    exact = queryset.filter(image_hash=image_hash).order_by('pk').first()
+    if exact is not None or get_distance() == 0:
+        return exact
+    match = load_tree(exclude=exclude).nearest(int(image_hash, 16), get_distance())
+    if match is None:
+        return None
+    return queryset.filter(pk=match[1][0]).first()
+
+
+def describe_duplicate(pk, title):
+    return f'Looks like a duplicate of "{title}" (#{pk}).'
+
+
+def find_clusters(rows, max_distance):
+    """
+    Group ``rows`` of ``(pk, hash)``, oldest first, into clusters of near
+    duplicates. Returns ``{original_pk: [(pk, distance), ...]}``, where the
+    original is the oldest photo of each cluster and each distance is to
+    the nearest older photo.
+    """
+    tree = BKTree()
+    parent = {}
+    position = {}
+
+    def root(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    matched = []
+    for index, (pk, image_hash) in enumerate(rows):
+        value = int(image_hash, 16)
+        parent[pk] = pk
+        position[pk] = index
+        found = tree.search(value, max_distance)
+        for distance, other in found:
+            a, b = root(pk), root(other)
+            if a != b:
+                # The oldest photo stays the root of the merged cluster.
+                older, newer = sorted((a, b), key=position.get)
+                parent[newer] = older
+        if found:
+            matched.append((pk, found[0][0]))
+        tree.add(value, pk)
+
+    clusters = {}
+    for pk, distance in matched:
+        clusters.setdefault(root(pk), []).append((pk, distance))
+    return clusters
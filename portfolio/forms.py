@@ -1,6 +1,7 @@
 from django import forms
 from django.core.validators import EmailValidator
-from .models import QuoteRequest, ContactMessage, Service
+from .cache import get_services
+from .models import QuoteRequest, ContactMessage
 
 
 class QuoteRequestForm(forms.ModelForm):
@@ -69,11 +70,9 @@ class ContactForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Dynamically populate service choices from database
+        # Populate service choices from the cached list of active services
         service_choices = [('', 'Select a service...')]
-        active_services = Service.objects.filter(is_active=True).order_by('order', 'name')
-        for service in active_services:
-            service_choices.append((service.name.lower().replace(' ', '_'), service.name))
+        service_choices.extend(get_services().items())
         self.fields['service_interest'].choices = service_choices
     
     class Meta:
@@ -0,0 +1,349 @@
+"""
+Image processing helpers for the portfolio app.
+
+Every uploaded image gets a set of resized, re-encoded derivatives stored
+next to the original, e.g. ``gallery/2024/05/01/shoot.jpg`` produces
+``gallery/2024/05/01/shoot_640w.webp``. Templates pick them up through the
+``responsive_image`` tag in ``portfolio_images``.
+
+The pipeline also records each image's displayed size and file size in
+``<field>_width``, ``<field>_height`` and ``<field>_bytes``, so nothing
+needs to open the file to lay it out, and sets ``<field>_derivatives`` once
+the derivatives have been written. Images in ``PLACEHOLDER_FIELDS`` also
+get a tiny blurred JPEG, stored as a data URI in ``<field>_placeholder``,
+and a dominant colour in ``<field>_color``, which pages inline so something
+shows before the image arrives. Images in ``HASH_FIELDS`` get a perceptual
+hash in ``<field>_hash`` for duplicate detection (see ``portfolio.duplicates``).
+"""
+import base64
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps, features
+
+logger = logging.getLogger('portfolio')
+
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+
+# Encoder options per output format; the first format the browser accepts wins.
+FORMAT_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 78, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+FILE_EXTENSIONS = {
+    'avif': 'avif',
+    'webp': 'webp',
+    'jpeg': 'jpg',
+}
+
+
+def get_widths():
+    """Return the configured derivative widths, smallest first."""
+    return sorted(getattr(settings, 'PORTFOLIO_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def get_formats():
+    """
+    Return the derivative formats, most efficient first.
+
+    Formats the installed Pillow cannot encode are dropped, and JPEG is
+    always kept last as the universal fallback.
+    """
+    formats = getattr(settings, 'PORTFOLIO_IMAGE_FORMATS', ('avif', 'webp'))
+    available = [fmt for fmt in formats if fmt != 'jpeg' and features.check(fmt)]
+    return available + ['jpeg']
+
+
+def derivative_widths(original_width):
+    """
+    Return the derivative widths written for an image ``original_width``
+    pixels wide: every configured width below it, then the next one up, if
+    any, which holds a copy at the original size.
+    """
+    widths = get_widths()
+    smaller = [width for width in widths if width < original_width]
+    return smaller + [width for width in widths if width >= original_width][:1]
+
+
+def derivative_name(name, width, fmt):
+    """Return the storage name of the ``width`` pixel wide ``fmt`` derivative of ``name``."""
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{FILE_EXTENSIONS[fmt]}"
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), **FORMAT_OPTIONS[fmt])
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(fieldfile, force=False):
+    """
+    Write the width/format derivatives of ``fieldfile`` (see
+    ``derivative_widths()``) to its storage.
+
+    Images are never upscaled: the original size is written once, under the
+    first configured width at or above it. Existing derivatives are left
+    alone unless ``force`` is set; they are complete when the last file
+    written, the largest JPEG, exists. Returns the number of files written.
+    """
+    if not fieldfile:
+        return 0
+
+    # Derivatives are named after the original, not their own content.
+    storage = getattr(fieldfile.storage, 'derivative_storage', fieldfile.storage)
+    formats = get_formats()
+
+    with fieldfile.storage.open(fieldfile.name, 'rb') as source:
+        original = Image.open(source)
+        widths = derivative_widths(_displayed_size(original)[0])
+        if not force and storage.exists(derivative_name(fieldfile.name, widths[-1], formats[-1])):
+            return 0
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+        original.load()
+
+    written = 0
+    for width in widths:
+        if width < original.width:
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), Image.LANCZOS)
+        else:
+            resized = original
+
+        for fmt in formats:
+            image = resized
+            if fmt == 'jpeg' and image.mode == 'RGBA':
+                image = image.convert('RGB')
+            name = derivative_name(fieldfile.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, _encode(image, fmt))
+            written += 1
+
+    return written
+
+
+PLACEHOLDER_SIZE = 16
+
+
+def generate_placeholder(fieldfile):
+    """
+    Return ``(data_uri, colour)`` for ``fieldfile``: a blurred JPEG at most
+    ``PLACEHOLDER_SIZE`` pixels on its long side, and the most common colour
+    as ``#rrggbb``.
+    """
+    with fieldfile.storage.open(fieldfile.name, 'rb') as source:
+        image = Image.open(source)
+        # Let JPEG decode at a fraction of its size; far cheaper than a full decode.
+        image.draft('RGB', (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        image.thumbnail((PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4), Image.LANCZOS)
+
+    palette = image.quantize(colors=8)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.LANCZOS)
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=40, optimize=True)
+    data_uri = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+    return data_uri, f'#{red:02x}{green:02x}{blue:02x}'
+
+
+HASH_SIZE = 8
+
+
+def perceptual_hash(file):
+    """
+    Return the 64-bit difference hash (dHash) of the image in the open
+    ``file`` as 16 hex digits. Each bit says whether a pixel of a 9 × 8
+    grayscale thumbnail is brighter than its right neighbour, so resizing,
+    recompression and small edits flip only a few bits.
+    """
+    image = Image.open(file)
+    image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    image = ImageOps.exif_transpose(image).convert('L')
+    pixels = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f'{bits:016x}'
+
+
+# EXIF orientations that rotate the image by 90 degrees.
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+ORIENTATION_TAG = 0x0112
+
+
+def _displayed_size(image):
+    """Return the ``(width, height)`` of an opened ``image`` after EXIF rotation, from its header."""
+    width, height = image.size
+    if image.getexif().get(ORIENTATION_TAG) in ROTATED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def read_dimensions(fieldfile):
+    """
+    Return ``(width, height, bytes)`` for ``fieldfile``, as displayed after
+    EXIF rotation. Only the image header is read.
+    """
+    storage = fieldfile.storage
+    with storage.open(fieldfile.name, 'rb') as source:
+        width, height = _displayed_size(Image.open(source))
+    return width, height, storage.size(fieldfile.name)
+
+
+def has_placeholder(instance, field_name):
+    return (instance._meta.label, field_name) in PLACEHOLDER_FIELDS
+
+
+def has_hash(instance, field_name):
+    return (instance._meta.label, field_name) in HASH_FIELDS
+
+
+def set_image_metadata(instance, field_name, placeholder=True, fingerprint=True):
+    """
+    Record the dimensions and byte size of ``instance``'s ``field_name``
+    image, and for ``PLACEHOLDER_FIELDS`` and ``HASH_FIELDS`` unless
+    ``placeholder`` or ``fingerprint`` is false its placeholder and
+    perceptual hash, on the instance without saving. Returns the changed
+    fields as a dict, or ``None`` if the image could not be read.
+    """
+    fieldfile = getattr(instance, field_name)
+    placeholder = placeholder and has_placeholder(instance, field_name)
+    fingerprint = fingerprint and has_hash(instance, field_name)
+    values = dict.fromkeys((f'{field_name}_width', f'{field_name}_height', f'{field_name}_bytes'))
+    if placeholder:
+        values.update(dict.fromkeys((f'{field_name}_placeholder', f'{field_name}_color'), ''))
+    if fingerprint:
+        values[f'{field_name}_hash'] = ''
+    if fieldfile:
+        try:
+            values[f'{field_name}_width'], values[f'{field_name}_height'], values[f'{field_name}_bytes'] = (
+                read_dimensions(fieldfile)
+            )
+            if placeholder:
+                values[f'{field_name}_placeholder'], values[f'{field_name}_color'] = generate_placeholder(fieldfile)
+            if fingerprint:
+                with fieldfile.storage.open(fieldfile.name, 'rb') as source:
+                    values[f'{field_name}_hash'] = perceptual_hash(source)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read image {fieldfile.name}: {str(e)}")
+            return None
+    for name, value in values.items():
+        setattr(instance, name, value)
+    return values
+
+
+def has_image_metadata(instance, field_name):
+    if getattr(instance, f'{field_name}_width') is None:
+        return False
+    if has_hash(instance, field_name) and not getattr(instance, f'{field_name}_hash'):
+        return False
+    return not has_placeholder(instance, field_name) or bool(getattr(instance, f'{field_name}_placeholder'))
+
+
+def describe_image(instance, field_name):
+    """Return e.g. ``'1600 × 1067 px, 245.1 KB'`` from the recorded metadata, or ``''``."""
+    width = getattr(instance, f'{field_name}_width')
+    if width is None:
+        return ''
+    height, size = getattr(instance, f'{field_name}_height'), getattr(instance, f'{field_name}_bytes')
+    return f'{width} × {height} px, {filesizeformat(size)}'
+
+
+def update_image_metadata(instance, field_name, force=False, derivatives=None):
+    """
+    Compute and save the metadata of a saved ``instance``'s ``field_name``
+    image if it is missing (or stale, for a removed image), and
+    ``derivatives``, if given, as ``<field>_derivatives``. Saves with
+    ``update()``, so no signals fire. Returns whether the row was updated.
+    """
+    values = {}
+    flag = f'{field_name}_derivatives'
+    if derivatives is not None and getattr(instance, flag) != derivatives:
+        values[flag] = derivatives
+        setattr(instance, flag, derivatives)
+    if force or has_image_metadata(instance, field_name) != bool(getattr(instance, field_name)):
+        values.update(set_image_metadata(instance, field_name) or {})
+    if not values:
+        return False
+    if hasattr(instance, 'updated_at'):
+        # Pages' ETags come from updated_at; let them pick up the new values.
+        values['updated_at'] = instance.updated_at = timezone.now()
+    type(instance)._default_manager.filter(pk=instance.pk).update(**values)
+    return True
+
+
+def process_image(fieldfile, force=False):
+    """
+    Run the upload pipeline for ``fieldfile``, logging instead of raising on
+    bad files. Returns the number of derivatives written, or ``None`` if
+    they could not be.
+    """
+    try:
+        return generate_derivatives(fieldfile, force=force)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to process image {fieldfile.name}: {str(e)}")
+        return None
+
+
+def process_file(label, field_name, name, force=False, metadata=True):
+    """
+    Run the whole pipeline for the stored image ``name`` of ``label``'s
+    ``field_name`` without touching the database, e.g. in a worker process.
+
+    Returns ``(written, values)``: the number of derivatives written (``None``
+    if that failed) and the fields to save, which hold the metadata unless
+    ``metadata`` is false and always ``<field>_derivatives``, or ``None`` if
+    the image could not be read.
+    """
+    instance = apps.get_model(label)(**{field_name: name})
+    written = process_image(getattr(instance, field_name), force=force)
+    values = set_image_metadata(instance, field_name) if metadata else {}
+    if values is not None:
+        values[f'{field_name}_derivatives'] = written is not None
+    return written, values
+
+
+# Every model image field that goes through the pipeline, as (model label, field name).
+IMAGE_FIELDS = (
+    ('portfolio.GalleryImage', 'image'),
+    ('portfolio.ProfileImage', 'image'),
+    ('portfolio.PortfolioItem', 'main_image'),
+    ('portfolio.PortfolioImage', 'image'),
+    ('portfolio.Package', 'image'),
+)
+
+# Image fields with a ``<field>_placeholder`` and ``<field>_color`` to fill in.
+PLACEHOLDER_FIELDS = (
+    ('portfolio.GalleryImage', 'image'),
+    ('portfolio.ProfileImage', 'image'),
+    ('portfolio.PortfolioItem', 'main_image'),
+)
+
+# Image fields with a ``<field>_hash`` perceptual hash to fill in.
+HASH_FIELDS = (
+    ('portfolio.GalleryImage', 'image'),
+)
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portfolio.images import IMAGE_FIELDS, process_image, set_image_metadata
+from portfolio.signals import invalidate_model_caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Record the width, height and file size of images uploaded before they were tracked, '
+        'writing any missing derivatives first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-read every image, not just those without dimensions.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of images read concurrently (default: chosen by Python).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Rows read and saved per batch.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for label, field_name in IMAGE_FIELDS:
+                total += self.backfill(executor, apps.get_model(label), field_name, options)
+        self.stdout.write(self.style.SUCCESS(f"Recorded dimensions of {total} images."))
+
+    def backfill(self, executor, model, field_name, options):
+        fields = [
+            f'{field_name}_width', f'{field_name}_height', f'{field_name}_bytes', f'{field_name}_derivatives',
+        ]
+        if any(field.name == 'updated_at' for field in model._meta.fields):
+            # Pages' ETags come from updated_at; let them pick up the dimensions.
+            fields.append('updated_at')
+
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if not options['force']:
+            queryset = queryset.filter(**{f'{field_name}_width__isnull': True})
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+
+        def read(instance):
+            # Templates size derivatives from the recorded width, so make sure
+            # they exist first. All database writes stay on this thread.
+            written = process_image(getattr(instance, field_name))
+            values = set_image_metadata(instance, field_name, placeholder=False, fingerprint=False)
+            setattr(instance, f'{field_name}_derivatives', written is not None)
+            return values
+
+        updated = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(pks), batch_size):
+            batch = list(model.objects.filter(pk__in=pks[start:start + batch_size]).only('pk', field_name, *fields))
+            changed = [instance for instance, values in zip(batch, executor.map(read, batch)) if values is not None]
+            if 'updated_at' in fields:
+                now = timezone.now()
+                for instance in changed:
+                    instance.updated_at = now
+            model.objects.bulk_update(changed, fields)
+            updated += len(changed)
+            self.stdout.write(f"{model._meta.label}: {start + len(batch)}/{len(pks)}")
+
+        if updated:
+            # bulk_update() sends no signals.
+            invalidate_model_caches(model)
+        return updated
@@ -0,0 +1,148 @@
+import json
+import logging
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from portfolio import benchmark
+
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'portfolio-bench',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every public and admin page against a freshly seeded test database '
+        'and optionally compare the results with a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed requests per URL (default: 20).',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Untimed requests per URL before timing starts (default: 2).',
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=3,
+            help='Multiply the size of the seeded dataset (default: 3).',
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            help='Only benchmark URL names containing this text. Can be repeated.',
+        )
+        parser.add_argument(
+            '--no-page-cache',
+            action='store_true',
+            help='Render public pages on every request instead of serving them from the page cache.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the JSON report to this file.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Compare against this JSON report and fail on regressions.',
+        )
+        parser.add_argument(
+            '--latency-threshold',
+            type=float,
+            default=benchmark.LATENCY_THRESHOLD * 100,
+            help='Allowed p95 latency increase over the baseline, in percent (default: %(default)s).',
+        )
+        parser.add_argument(
+            '--memory-threshold',
+            type=float,
+            default=benchmark.MEMORY_THRESHOLD * 100,
+            help='Allowed peak memory increase over the baseline, in percent (default: %(default)s).',
+        )
+        parser.add_argument(
+            '--query-threshold',
+            type=int,
+            default=benchmark.QUERY_THRESHOLD,
+            help='Extra queries per URL allowed over the baseline (default: %(default)s).',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        report = self.run_benchmarks(options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote report to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmark.compare(
+                report,
+                baseline,
+                latency=options['latency_threshold'] / 100,
+                memory=options['memory_threshold'] / 100,
+                queries=options['query_threshold'],
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def run_benchmarks(self, options):
+        """Seed a throwaway database, media directory and cache, and benchmark against them."""
+        self.stdout.write(
+            f"{'URL':<55} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'queries':>7} {'bytes':>8} {'peak KB':>8}"
+        )
+
+        def log(name, result):
+            self.stdout.write(
+                f"{name:<55} {result['status']:>6} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                f"{result['queries']:>7} {result['bytes']:>8} {result['peak_memory_kb']:>8.0f}"
+            )
+
+        # Benchmark as production runs: DEBUG off, so queries are not logged.
+        setup_test_environment(debug=False)
+        # Hundreds of requests follow; keep the per-request log out of the report.
+        request_logger = logging.getLogger('portfolio.requests')
+        log_level = request_logger.level
+        request_logger.setLevel(logging.WARNING)
+        overrides = {'CACHES': BENCH_CACHES}
+        if options['no_page_cache']:
+            overrides['PORTFOLIO_PAGE_CACHE'] = False
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root, **overrides):
+                user = benchmark.seed(scale=options['scale'])
+                return benchmark.run(
+                    user,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    only=options['only'],
+                    log=log,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            request_logger.setLevel(log_level)
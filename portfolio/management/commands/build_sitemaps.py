@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.sitemaps import build, build_pending, get_sitemap_dir
+
+
+class Command(BaseCommand):
+    help = 'Render the sitemap index and every sitemap section to gzip files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sections',
+            nargs='*',
+            help='Only rebuild these sections (default: all).',
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only rebuild the sections whose content changed since they were last built; '
+                 'run this every few minutes.',
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            counts = build_pending()
+            if not counts:
+                self.stdout.write("No sections to rebuild.")
+                return
+        else:
+            counts = build(options['sections'] or None)
+        for section, count in counts.items():
+            self.stdout.write(f"{section}: {count} URLs")
+        self.stdout.write(f"Wrote sitemaps to {get_sitemap_dir()}")
@@ -0,0 +1,129 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portfolio.images import IMAGE_FIELDS, derivative_name, get_formats, get_widths
+from portfolio.signals import invalidate_model_caches
+from portfolio.storage import is_content_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Move existing images into content-addressed storage: store each file under its SHA-256, '
+        'point the rows at it and copy its derivatives, so identical files are kept once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many images would move without changing anything.',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Leave the old files in place instead of deleting them afterwards.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Rows saved per batch.',
+        )
+
+    def handle(self, *args, **options):
+        for label, field_name in IMAGE_FIELDS:
+            storage = apps.get_model(label)._meta.get_field(field_name).storage
+            if not hasattr(storage, 'add_reference'):
+                raise CommandError(
+                    f"{label}.{field_name} does not use content-addressed storage; "
+                    "check STORAGES['media']."
+                )
+
+        if options['dry_run']:
+            for label, field_name in IMAGE_FIELDS:
+                count = sum(1 for name in self.get_names(label, field_name) if not is_content_name(name))
+                self.stdout.write(f"Would convert {count} {label}.{field_name} images.")
+            return
+
+        # Old files stay until every field is converted: rows of several
+        # models may share a file.
+        old_names, kept_names = {}, set()
+        total = 0
+        for label, field_name in IMAGE_FIELDS:
+            total += self.convert(label, field_name, old_names, kept_names, options)
+
+        deleted = 0
+        if not options['keep_originals']:
+            for name, storage in sorted(old_names.items()):
+                if name not in kept_names:
+                    self.delete_with_derivatives(storage, name)
+                    deleted += 1
+        self.stdout.write(self.style.SUCCESS(f"Converted {total} images; deleted {deleted} old files."))
+
+    def get_names(self, label, field_name):
+        model = apps.get_model(label)
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        return queryset.values_list(field_name, flat=True).iterator()
+
+    def convert(self, label, field_name, old_names, kept_names, options):
+        model = apps.get_model(label)
+        storage = model._meta.get_field(field_name).storage
+        fields = [field_name]
+        if any(field.name == 'updated_at' for field in model._meta.fields):
+            # Pages' ETags come from updated_at; let them pick up the new URLs.
+            fields.append('updated_at')
+
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        pending = []
+        converted = 0
+        for pk, name in queryset.order_by('pk').values_list('pk', field_name).iterator():
+            if is_content_name(name):
+                continue
+            try:
+                with storage.open(name, 'rb') as source:
+                    new_name = storage.save(name, source)
+                self.copy_derivatives(storage, name, new_name)
+            except OSError as e:
+                self.stderr.write(f"{label} #{pk}: could not convert {name}: {e}")
+                kept_names.add(name)
+                continue
+            old_names[name] = storage
+            instance = model(pk=pk, **{field_name: new_name})
+            if 'updated_at' in fields:
+                instance.updated_at = timezone.now()
+            pending.append(instance)
+            if len(pending) >= options['batch_size']:
+                converted += self.save(model, pending, fields)
+        if pending:
+            converted += self.save(model, pending, fields)
+
+        if converted:
+            # bulk_update() sends no signals.
+            invalidate_model_caches(model)
+            self.stdout.write(f"{label}.{field_name}: converted {converted} images.")
+        return converted
+
+    def save(self, model, instances, fields):
+        model.objects.bulk_update(instances, fields)
+        count = len(instances)
+        instances.clear()
+        return count
+
+    def derivative_names(self, name):
+        return [derivative_name(name, width, fmt) for width in get_widths() for fmt in get_formats()]
+
+    def copy_derivatives(self, storage, name, new_name):
+        derivatives = storage.derivative_storage
+        for old, new in zip(self.derivative_names(name), self.derivative_names(new_name)):
+            if derivatives.exists(old) and not derivatives.exists(new):
+                with derivatives.open(old, 'rb') as source:
+                    derivatives.save(new, source)
+
+    def delete_with_derivatives(self, storage, name):
+        # Through the plain storage: ContentAddressedStorage.delete() leaves
+        # names outside content/ alone.
+        derivatives = storage.derivative_storage
+        for derivative in self.derivative_names(name):
+            derivatives.delete(derivative)
+        derivatives.delete(name)
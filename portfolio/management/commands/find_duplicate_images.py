@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portfolio.duplicates import find_clusters, get_distance
+from portfolio.models import GalleryImage
+from portfolio.signals import invalidate_model_caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Group gallery images into clusters of near-duplicates by perceptual hash. Photos without '
+        'a hash yet are skipped; run process_images to hash them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--distance',
+            type=int,
+            default=None,
+            help='Maximum differing bits between duplicates (default: PORTFOLIO_DUPLICATE_DISTANCE).',
+        )
+        parser.add_argument(
+            '--flag',
+            action='store_true',
+            help='Point each duplicate at the oldest photo of its cluster (duplicate_of) and clear '
+                 'flags that no longer apply.',
+        )
+
+    def handle(self, *args, **options):
+        distance = get_distance() if options['distance'] is None else options['distance']
+        queryset = GalleryImage.objects.exclude(image_hash='').order_by('created_at', 'pk')
+        titles = {}
+        rows = []
+        for pk, image_hash, title in queryset.values_list('pk', 'image_hash', 'title').iterator():
+            titles[pk] = title
+            rows.append((pk, image_hash))
+        clusters = find_clusters(rows, distance)
+
+        unhashed = GalleryImage.objects.filter(image_hash='').count()
+        if unhashed:
+            self.stdout.write(self.style.WARNING(
+                f"{unhashed} images have no hash yet; run process_images to include them."
+            ))
+
+        for original, members in clusters.items():
+            self.stdout.write(f"#{original} {titles[original]}")
+            for pk, bits in members:
+                self.stdout.write(f"  #{pk} {titles[pk]} ({bits} bits apart)")
+
+        duplicate_count = sum(len(members) for members in clusters.values())
+        if options['flag']:
+            flagged = self.flag(clusters)
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(clusters)} clusters, {duplicate_count} duplicates; updated {flagged} images."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(clusters)} clusters, {duplicate_count} duplicates among {len(rows)} images."
+            ))
+
+    def flag(self, clusters):
+        wanted = {}
+        for original, members in clusters.items():
+            for pk, _ in members:
+                wanted[pk] = original
+        now = timezone.now()
+        changed = []
+        # Only rows whose flag actually changes, including stale flags to clear.
+        current = dict(GalleryImage.objects.exclude(duplicate_of=None).values_list('pk', 'duplicate_of'))
+        for pk in set(wanted) | set(current):
+            if wanted.get(pk) != current.get(pk):
+                changed.append(GalleryImage(pk=pk, duplicate_of_id=wanted.get(pk), updated_at=now))
+        if changed:
+            GalleryImage.objects.bulk_update(changed, ['duplicate_of', 'updated_at'], batch_size=500)
+            # bulk_update() sends no signals.
+            invalidate_model_caches(GalleryImage)
+        return len(changed)
@@ -0,0 +1,253 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from portfolio.images import IMAGE_FIELDS, has_image_metadata, process_file
+from portfolio.signals import invalidate_model_caches
+
+
+def _init_worker():
+    # Workers started with "spawn" (macOS, Windows) begin without Django set up.
+    django.setup()
+
+
+def _ready():
+    return True
+
+
+class InlineExecutor:
+    """Runs "submitted" work immediately, for ``--workers 1``."""
+
+    class Done:
+        def __init__(self, value):
+            self.value = value
+
+        def result(self):
+            return self.value
+
+    def submit(self, fn, *args):
+        return self.Done(fn(*args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate responsive image derivatives, dimensions and placeholders for every uploaded '
+        'image, on every core. Progress is checkpointed, so an interrupted run resumes where it '
+        'stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives and metadata even where they already exist.',
+        )
+        parser.add_argument(
+            '--model',
+            action='append',
+            dest='models',
+            metavar='MODEL',
+            help='Only process this model, e.g. GalleryImage (repeatable).',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only process images uploaded on or after this date or datetime (ISO 8601).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be processed without writing anything.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (default: one per CPU; 1 runs in this process).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Results saved, and progress checkpointed, per batch (default: 100).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.MEDIA_ROOT, '.process_images.json'),
+            help='Progress file used to resume an interrupted run.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any saved progress and start from the beginning.',
+        )
+
+    def handle(self, *args, **options):
+        fields = self.get_fields(options['models'])
+        since = self.parse_since(options['since'])
+
+        if options['dry_run']:
+            for label, field_name in fields:
+                queryset = self.get_queryset(label, field_name, since)
+                self.stdout.write(f"Would process {queryset.count()} {label}.{field_name} images.")
+            return
+
+        self.checkpoint_path = options['checkpoint']
+        self.run_key = {
+            'fields': [f'{label}.{field_name}' for label, field_name in fields],
+            'since': options['since'],
+            'force': options['force'],
+        }
+        self.progress = self.load_checkpoint(options['restart'])
+
+        if options['workers'] > 1:
+            # Start the workers now, while no database connection is open for
+            # them to inherit.
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+            executor.submit(_ready).result()
+        else:
+            executor = InlineExecutor()
+        total = 0
+        try:
+            for label, field_name in fields:
+                total += self.process_field(executor, label, field_name, since, options)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise CommandError('Interrupted; run the command again to resume.')
+        executor.shutdown()
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} images."))
+
+    def get_fields(self, models):
+        if not models:
+            return list(IMAGE_FIELDS)
+        wanted = {name.lower().rsplit('.', 1)[-1] for name in models}
+        known = {label.lower().rsplit('.', 1)[-1] for label, _ in IMAGE_FIELDS}
+        unknown = wanted - known
+        if unknown:
+            raise CommandError(
+                f"Unknown model {', '.join(sorted(unknown))}; choose from "
+                f"{', '.join(label.rsplit('.', 1)[-1] for label, _ in IMAGE_FIELDS)}."
+            )
+        return [(label, field) for label, field in IMAGE_FIELDS if label.lower().rsplit('.', 1)[-1] in wanted]
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f"Invalid --since {value!r}; use YYYY-MM-DD or an ISO 8601 datetime.")
+            since = datetime.combine(date, time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def get_queryset(self, label, field_name, since):
+        model = apps.get_model(label)
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if since is not None:
+            # created_at, unlike updated_at, is not changed by saving the results.
+            queryset = queryset.filter(created_at__gte=since)
+        return queryset
+
+    def load_checkpoint(self, restart):
+        if restart or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('run') != self.run_key:
+            self.stdout.write(self.style.WARNING('Saved progress is for different options; starting over.'))
+            return {}
+        self.stdout.write(f"Resuming from {self.checkpoint_path}.")
+        return checkpoint['done']
+
+    def save_checkpoint(self):
+        temp_path = f'{self.checkpoint_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'run': self.run_key, 'done': self.progress}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def process_field(self, executor, label, field_name, since, options):
+        """
+        Stream the rows of one image field through the workers in primary key
+        order. Results are collected in that order too, so the checkpoint is
+        simply the last primary key saved.
+        """
+        key = f'{label}.{field_name}'
+        model = apps.get_model(label)
+        metadata_fields = [
+            field.name for field in model._meta.fields
+            if field.name.startswith(f'{field_name}_') or field.name == 'updated_at'
+        ]
+        queryset = self.get_queryset(label, field_name, since)
+        if key in self.progress:
+            queryset = queryset.filter(pk__gt=self.progress[key])
+        rows = queryset.order_by('pk').only('pk', field_name, *metadata_fields).iterator(chunk_size=2000)
+        total = queryset.count()
+
+        pending = deque()
+        window = max(1, options['workers']) * 4
+        results = []
+        done = updated = 0
+
+        def flush():
+            nonlocal updated
+            now = timezone.now()
+            changed = []
+            for instance, values in results:
+                if values and any(getattr(instance, name) != value for name, value in values.items()):
+                    for name, value in values.items():
+                        setattr(instance, name, value)
+                    instance.updated_at = now
+                    changed.append(instance)
+            if changed:
+                model.objects.bulk_update(changed, metadata_fields)
+                updated += len(changed)
+            self.progress[key] = results[-1][0].pk
+            self.save_checkpoint()
+            results.clear()
+            self.stdout.write(f"{key}: {done}/{total}")
+
+        def collect():
+            nonlocal done
+            instance, future = pending.popleft()
+            written, values = future.result()
+            results.append((instance, values))
+            done += 1
+            if len(results) >= options['batch_size']:
+                flush()
+
+        for instance in rows:
+            fieldfile = getattr(instance, field_name)
+            need_metadata = options['force'] or not has_image_metadata(instance, field_name)
+            pending.append((instance, executor.submit(
+                process_file, label, field_name, fieldfile.name, options['force'], need_metadata,
+            )))
+            if len(pending) >= window:
+                collect()
+        while pending:
+            collect()
+        if results:
+            flush()
+
+        if updated:
+            # bulk_update() sends no signals.
+            invalidate_model_caches(model)
+        return done
@@ -0,0 +1,72 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio.models import StoredFile
+from portfolio.storage import CONTENT_DIR, is_content_name, media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete content-addressed images that no StoredFile row tracks, with their derivatives, '
+        'and abandoned temporary uploads. Such files are left by rolled back uploads and crashes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Only delete files older than this many hours, so uploads still in progress are kept.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the files that would be deleted without deleting them.',
+        )
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        if not hasattr(storage, 'add_reference'):
+            raise CommandError("STORAGES['media'] is not content-addressed; there is nothing to prune.")
+        cutoff = time.time() - options['min_age'] * 60 * 60
+
+        untracked = self.untracked_names(storage, cutoff)
+        incoming = self.stale_incoming(storage, cutoff)
+        for name in untracked:
+            self.stdout.write(f"Untracked: {name}")
+            if not options['dry_run']:
+                storage.delete_file(name)
+        for path in incoming:
+            self.stdout.write(f"Abandoned upload: {path}")
+            if not options['dry_run']:
+                os.remove(path)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(untracked)} untracked images and {len(incoming)} abandoned uploads."
+        ))
+
+    def untracked_names(self, storage, cutoff):
+        candidates = []
+        root = storage.path(CONTENT_DIR)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                # Derivatives (``<sha256>_640w.webp``) go with their original.
+                if is_content_name(name) and os.path.getmtime(path) < cutoff:
+                    candidates.append(name)
+        tracked = set()
+        for start in range(0, len(candidates), 500):
+            batch = candidates[start:start + 500]
+            tracked.update(StoredFile.objects.filter(name__in=batch).values_list('name', flat=True))
+        return sorted(name for name in candidates if name not in tracked)
+
+    def stale_incoming(self, storage, cutoff):
+        directory = storage.path('.incoming')
+        if not os.path.isdir(directory):
+            return []
+        paths = (os.path.join(directory, filename) for filename in os.listdir(directory))
+        return sorted(path for path in paths if os.path.isfile(path) and os.path.getmtime(path) < cutoff)
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from portfolio.ratelimit import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Show how many contact and quote submissions the rate limiter allowed and refused, '
+        'since the counters were last reset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the counters as JSON, for monitoring.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them.',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        if options['json']:
+            self.stdout.write(json.dumps(stats))
+        else:
+            for scope, counts in stats.items():
+                self.stdout.write(
+                    f"{scope}: {counts['allowed']} allowed, {counts['rejected_ip']} refused by IP, "
+                    f"{counts['rejected_email']} refused by email"
+                )
+        if options['reset']:
+            reset_stats()
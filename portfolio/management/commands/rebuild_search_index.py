@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for portfolio items.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} portfolio items with {backend.__class__.__name__}."
+        ))
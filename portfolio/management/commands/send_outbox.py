@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from portfolio.outbox import MAX_ATTEMPTS, drain
+
+logger = logging.getLogger('portfolio')
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails from the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails claimed per batch (default: 50).',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=MAX_ATTEMPTS,
+            help=f'Give up on an email after this many failures (default: {MAX_ATTEMPTS}).',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling the outbox every --interval seconds.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Seconds to sleep between polls with --loop (default: 10).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = drain(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                )
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                # A worker that stays up retries once the database or mail server is back.
+                logger.exception(f"Draining the outbox failed: {str(e)}")
+                time.sleep(options['interval'])
+                continue
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,192 @@
+"""
+Serving uploaded media.
+
+``serve_media`` answers conditional requests from the file's size and
+modification time, supports single byte ranges (resumable downloads, video
+seeking) and lets browsers cache files for ``PORTFOLIO_MEDIA_MAX_AGE``
+seconds, or a year with ``immutable`` for content-addressed originals (see
+``portfolio.storage``), whose bytes never change under the same name.
+Whole files go out through the WSGI server's ``sendfile`` support.
+
+With ``PORTFOLIO_MEDIA_ACCEL`` set, Django only checks the request and
+hands the file to the front web server instead:
+
+- ``'x-accel-redirect'`` (nginx): the response carries
+  ``X-Accel-Redirect: <PORTFOLIO_MEDIA_ACCEL_PREFIX><path>``, which must map
+  to an ``internal`` location aliased to ``MEDIA_ROOT``.
+- ``'x-sendfile'`` (Apache ``mod_xsendfile``, lighttpd): the response
+  carries ``X-Sendfile: <absolute path>``.
+
+The web server then streams the file and handles ranges itself.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_content_name
+
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+ACCEL_MODES = ('x-accel-redirect', 'x-sendfile')
+
+
+def get_accel_mode():
+    mode = (getattr(settings, 'PORTFOLIO_MEDIA_ACCEL', '') or '').lower()
+    if mode and mode not in ACCEL_MODES:
+        raise ValueError(f"PORTFOLIO_MEDIA_ACCEL must be one of {', '.join(ACCEL_MODES)}, not {mode!r}.")
+    return mode
+
+
+def resolve(path):
+    """Return the absolute path of media file ``path``, or raise ``Http404``."""
+    if any(part.startswith('.') for part in path.split('/')):
+        # Hidden files, including the sitemap builder's temporary files.
+        raise Http404('Media file not found.')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found.')
+    return full_path
+
+
+def get_etag(stat_result):
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte offsets (inclusive) requested by a
+    ``Range`` header, ``None`` to serve the whole file, or ``False`` if the
+    range cannot be satisfied. Multiple ranges are answered with the whole
+    file, which the RFC allows.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range: the last ``last`` bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    """Whether a ``Range`` request still applies to the current file."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    modified_since = parse_http_date_safe(value)
+    return modified_since is not None and int(mtime) <= modified_since
+
+
+class RangeFile:
+    """Read at most ``length`` bytes of ``file`` from ``start``."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve the file at ``path`` under ``MEDIA_ROOT``."""
+    full_path = resolve(path)
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found.')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Media file not found.')
+
+    etag = get_etag(stat_result)
+    mtime = stat_result.st_mtime
+    response = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if response is None:
+        response = build_response(request, path, full_path, stat_result, etag)
+
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        if is_content_name(path):
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(
+                response, public=True,
+                max_age=getattr(settings, 'PORTFOLIO_MEDIA_MAX_AGE', DEFAULT_MAX_AGE),
+            )
+    return response
+
+
+def build_response(request, path, full_path, stat_result, etag):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if encoding:
+        # Sitemap sections and the like are served as stored, not decoded.
+        content_type = 'application/gzip' if encoding == 'gzip' else 'application/octet-stream'
+    content_type = content_type or 'application/octet-stream'
+
+    mode = get_accel_mode()
+    if mode:
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            prefix = getattr(settings, 'PORTFOLIO_MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    size = stat_result.st_size
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and if_range_matches(request, etag, stat_result.st_mtime):
+        byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,60 @@
+"""
+Per-request performance counters.
+
+``RequestMetricsMiddleware`` installs a ``RequestMetrics`` for the request
+being handled; code anywhere below it can then add to the counters through
+the module level helpers, which do nothing outside a request.
+"""
+import contextvars
+import time
+
+current = contextvars.ContextVar('portfolio_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def time_query(self, execute, sql, params, many, context):
+        """Database execute wrapper adding each query to the counters."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Return the metrics as a ``Server-Timing`` header value, durations in milliseconds."""
+        return ', '.join([
+            f'total;dur={self.total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ])
+
+    def log_fields(self):
+        return (
+            f'total_ms={self.total * 1000:.1f} db_ms={self.db_time * 1000:.1f} queries={self.queries} '
+            f'template_ms={self.template_time * 1000:.1f} '
+            f'cache_hits={self.cache_hits} cache_misses={self.cache_misses}'
+        )
+
+
+def record_cache(hit):
+    """Count a cache lookup made while handling the current request."""
+    metrics = current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from portfolio.search import VENDOR_BACKENDS
+    backend_class = VENDOR_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class:
+        backend_class().install()
+
+
+def uninstall_search_index(apps, schema_editor):
+    from portfolio.search import VENDOR_BACKENDS
+    backend_class = VENDOR_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class:
+        backend_class().uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0009_contactmessage_service_interest'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
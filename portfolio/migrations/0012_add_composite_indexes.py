@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0011_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['is_responded', 'created_at'], name='portfolio_message_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at'], name='portfolio_message_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryimage',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'created_at'], name='portfolio_gallery_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'name'], name='portfolio_package_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolioitem',
+            index=models.Index(condition=models.Q(('published', True)), fields=['category', 'created_at', 'id'], name='portfolio_item_pub_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolioitem',
+            index=models.Index(condition=models.Q(('published', True)), fields=['created_at', 'id'], name='portfolio_item_pub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileimage',
+            index=models.Index(fields=['is_active', 'created_at'], name='portfolio_profile_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'name'], name='portfolio_service_active_idx'),
+        ),
+    ]
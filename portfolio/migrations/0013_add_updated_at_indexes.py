@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0012_add_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='galleryimage',
+            index=models.Index(fields=['updated_at'], name='portfolio_gallery_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['updated_at'], name='portfolio_package_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolioimage',
+            index=models.Index(fields=['updated_at'], name='portfolio_image_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolioitem',
+            index=models.Index(fields=['updated_at'], name='portfolio_item_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileimage',
+            index=models.Index(fields=['updated_at'], name='portfolio_profile_updated_idx'),
+        ),
+    ]
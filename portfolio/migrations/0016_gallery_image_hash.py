@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0015_add_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='galleryimage',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Earlier gallery image this one appears to duplicate.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='portfolio.galleryimage'),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='galleryimage',
+            index=models.Index(fields=['image_hash'], name='portfolio_gallery_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:34
+
+import portfolio.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0016_gallery_image_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stored File',
+                'verbose_name_plural': 'Stored Files',
+            },
+        ),
+        migrations.AlterField(
+            model_name='galleryimage',
+            name='image',
+            field=models.ImageField(storage=portfolio.storage.media_storage, upload_to='gallery/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='package',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Optional image for the package.', null=True, storage=portfolio.storage.media_storage, upload_to='packages/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='portfolioimage',
+            name='image',
+            field=models.ImageField(storage=portfolio.storage.media_storage, upload_to='portfolio/images/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='portfolioitem',
+            name='main_image',
+            field=models.ImageField(blank=True, help_text='Main image for the portfolio item.', storage=portfolio.storage.media_storage, upload_to='portfolio/main_images/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='profileimage',
+            name='image',
+            field=models.ImageField(storage=portfolio.storage.media_storage, upload_to='profile/'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0017_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='galleryimage',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='main_image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profileimage',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.utils.text import slugify
 from django.conf import settings
 from django.utils import timezone
 
+from .storage import media_storage
+
 class TimeStampedModel(models.Model):
     """
     An abstract base class model that provides self-updating
@@ -37,9 +39,17 @@ class PortfolioItem(TimeStampedModel):
     )
     main_image = models.ImageField(
         upload_to='portfolio/main_images/%Y/%m/%d/',
+        storage=media_storage,
         blank=True,
         help_text='Main image for the portfolio item.'
     )
+    # Filled in by the image pipeline (see portfolio.images).
+    main_image_placeholder = models.TextField(blank=True, editable=False)
+    main_image_color = models.CharField(max_length=7, blank=True, editable=False)
+    main_image_width = models.PositiveIntegerField(null=True, editable=False)
+    main_image_height = models.PositiveIntegerField(null=True, editable=False)
+    main_image_bytes = models.PositiveBigIntegerField(null=True, editable=False)
+    main_image_derivatives = models.BooleanField(default=False, editable=False)
     is_featured = models.BooleanField(
         default=False,
         help_text='Mark as featured to display on the homepage.'
@@ -53,6 +63,19 @@ class PortfolioItem(TimeStampedModel):
         ordering = ['-is_featured', '-created_at']
         verbose_name = 'Portfolio Item'
         verbose_name_plural = 'Portfolio Items'
+        indexes = [
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                condition=models.Q(published=True),
+                name='portfolio_item_pub_cat_idx',
+            ),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(published=True),
+                name='portfolio_item_pub_created_idx',
+            ),
+            models.Index(fields=['updated_at'], name='portfolio_item_updated_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -73,12 +96,20 @@ class PortfolioImage(TimeStampedModel):
         related_name='images',
         on_delete=models.CASCADE
     )
-    image = models.ImageField(upload_to='portfolio/images/%Y/%m/%d/')
+    image = models.ImageField(upload_to='portfolio/images/%Y/%m/%d/', storage=media_storage)
+    # Filled in by the image pipeline (see portfolio.images).
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_bytes = models.PositiveBigIntegerField(null=True, editable=False)
+    image_derivatives = models.BooleanField(default=False, editable=False)
     caption = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['order', '-created_at']
+        indexes = [
+            models.Index(fields=['updated_at'], name='portfolio_image_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.portfolio_item.title} - {self.caption or 'Image'}"
@@ -104,10 +135,16 @@ class Package(TimeStampedModel):
     )
     image = models.ImageField(
         upload_to='packages/%Y/%m/%d/',
+        storage=media_storage,
         blank=True,
         null=True,
         help_text='Optional image for the package.'
     )
+    # Filled in by the image pipeline (see portfolio.images).
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_bytes = models.PositiveBigIntegerField(null=True, editable=False)
+    image_derivatives = models.BooleanField(default=False, editable=False)
     is_active = models.BooleanField(
         default=True,
         help_text='Set to False to hide this package from the public site.'
@@ -115,6 +152,14 @@ class Package(TimeStampedModel):
     
     class Meta:
         ordering = ['category', 'name']
+        indexes = [
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(is_active=True),
+                name='portfolio_package_active_idx',
+            ),
+            models.Index(fields=['updated_at'], name='portfolio_package_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_category_display()}: {self.name}"
@@ -169,6 +214,10 @@ class ContactMessage(TimeStampedModel):
         ordering = ['-created_at']
         verbose_name = 'Contact Message'
         verbose_name_plural = 'Contact Messages'
+        indexes = [
+            models.Index(fields=['is_responded', 'created_at'], name='portfolio_message_status_idx'),
+            models.Index(fields=['created_at'], name='portfolio_message_created_idx'),
+        ]
     
     def __str__(self):
         return f"Message from {self.name} - {self.subject}"
@@ -177,7 +226,25 @@ class ContactMessage(TimeStampedModel):
 class GalleryImage(TimeStampedModel):
     """Model for gallery images displayed on homepage."""
     title = models.CharField(max_length=200, blank=True, help_text='Auto-generated from filename')
-    image = models.ImageField(upload_to='gallery/%Y/%m/%d/')
+    image = models.ImageField(upload_to='gallery/%Y/%m/%d/', storage=media_storage)
+    # Filled in by the image pipeline (see portfolio.images).
+    image_placeholder = models.TextField(blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_bytes = models.PositiveBigIntegerField(null=True, editable=False)
+    image_derivatives = models.BooleanField(default=False, editable=False)
+    # 64-bit perceptual hash in hex; near-identical photos differ in few bits (see portfolio.duplicates).
+    image_hash = models.CharField(max_length=16, blank=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='duplicates',
+        help_text='Earlier gallery image this one appears to duplicate.'
+    )
     alt_text = models.CharField(max_length=200, blank=True, help_text='Alternative text for accessibility')
     caption = models.CharField(max_length=300, blank=True)
     order = models.PositiveIntegerField(default=0, help_text='Order of display (lower numbers first)')
@@ -190,8 +257,22 @@ class GalleryImage(TimeStampedModel):
         ordering = ['order', '-created_at']
         verbose_name = 'Gallery Image'
         verbose_name_plural = 'Gallery Images'
+        indexes = [
+            models.Index(
+                fields=['order', 'created_at'],
+                condition=models.Q(is_active=True),
+                name='portfolio_gallery_active_idx',
+            ),
+            models.Index(fields=['updated_at'], name='portfolio_gallery_updated_idx'),
+            models.Index(fields=['image_hash'], name='portfolio_gallery_hash_idx'),
+        ]
     
     def save(self, *args, **kwargs):
+        self.populate_defaults()
+        super().save(*args, **kwargs)
+    
+    def populate_defaults(self):
+        """Fill in title and alt text from the filename. Call before bulk_create(), which skips save()."""
         # Auto-generate title from filename if not provided
         if not self.title and self.image:
             import os
@@ -205,8 +286,6 @@ class GalleryImage(TimeStampedModel):
         # Auto-generate alt_text from title if not provided
         if not self.alt_text and self.title:
             self.alt_text = self.title
-        
-        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.title or f"Gallery Image {self.id}"
@@ -215,7 +294,14 @@ class GalleryImage(TimeStampedModel):
 class ProfileImage(models.Model):
     """Model for profile images used across the site."""
     title = models.CharField(max_length=200)
-    image = models.ImageField(upload_to='profile/')
+    image = models.ImageField(upload_to='profile/', storage=media_storage)
+    # Filled in by the image pipeline (see portfolio.images).
+    image_placeholder = models.TextField(blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_bytes = models.PositiveBigIntegerField(null=True, editable=False)
+    image_derivatives = models.BooleanField(default=False, editable=False)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -225,6 +311,10 @@ class ProfileImage(models.Model):
         ordering = ['-is_active', '-created_at']
         verbose_name = "Profile Image"
         verbose_name_plural = "Profile Images"
+        indexes = [
+            models.Index(fields=['is_active', 'created_at'], name='portfolio_profile_active_idx'),
+            models.Index(fields=['updated_at'], name='portfolio_profile_updated_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -241,6 +331,13 @@ class Service(TimeStampedModel):
         ordering = ['order', 'name']
         verbose_name = 'Service'
         verbose_name_plural = 'Services'
+        indexes = [
+            models.Index(
+                fields=['order', 'name'],
+                condition=models.Q(is_active=True),
+                name='portfolio_service_active_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.name
@@ -281,3 +378,63 @@ class SiteSettings(models.Model):
             raise ValueError("Only one SiteSettings instance is allowed")
         super().save(*args, **kwargs)
 
+
+class OutboxEmail(TimeStampedModel):
+    """
+    Email queued for delivery by the ``send_outbox`` worker.
+
+    Notifications are written here in the same transaction as the record
+    they describe, so form submissions never wait on SMTP and no email is
+    lost if the mail server is down.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='The worker will not try to send this email before this time.'
+    )
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='portfolio_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+
+
+class StoredFile(models.Model):
+    """
+    A file in ``ContentAddressedStorage`` and how many image fields use it.
+    Maintained by the storage; the file is deleted with its last reference.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Stored File'
+        verbose_name_plural = 'Stored Files'
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
@@ -0,0 +1,137 @@
+"""
+Transactional email outbox.
+
+Views call ``enqueue()`` inside the transaction that saves the record the
+email is about; the ``send_outbox`` management command later delivers due
+emails in batches over a single SMTP connection, retrying failures with
+exponential backoff.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger('portfolio')
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+
+# How long a claimed batch is hidden from other workers. If a worker dies
+# mid-batch its emails become due again once the lease runs out.
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+def enqueue(subject, body, recipient_list, from_email=None):
+    """Queue an email for delivery. Call inside the transaction that creates its subject matter."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def backoff(attempts):
+    """Return the delay before retry number ``attempts``."""
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def claim_batch(batch_size):
+    """
+    Reserve up to ``batch_size`` due emails for this worker and return them.
+
+    Claimed rows have ``next_attempt_at`` pushed past the lease, so
+    concurrent workers skip them without holding a lock during delivery.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(
+            status=OutboxEmail.PENDING,
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + CLAIM_LEASE
+        )
+    return batch
+
+
+def record_failure(email, error, max_attempts=MAX_ATTEMPTS):
+    """Count a failed attempt at ``email``: retry it after a backoff, or give up after ``max_attempts``."""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.FAILED
+        logger.error(f"Giving up on outbox email {email.pk} after {email.attempts} attempts: {str(error)}")
+    else:
+        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+        logger.warning(f"Failed to send outbox email {email.pk}, will retry: {str(error)}")
+    email.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error', 'updated_at'])
+
+
+def deliver(email, connection, max_attempts=MAX_ATTEMPTS):
+    """Send one outbox email over ``connection`` and record the outcome. Returns True if sent."""
+    message = EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.recipients,
+        connection=connection,
+    )
+    try:
+        message.send(fail_silently=False)
+    except Exception as e:
+        record_failure(email, e, max_attempts=max_attempts)
+        return False
+
+    email.attempts += 1
+    email.status = OutboxEmail.SENT
+    email.sent_at = timezone.now()
+    email.last_error = ''
+    email.save(update_fields=['attempts', 'status', 'sent_at', 'last_error', 'updated_at'])
+    return True
+
+
+def drain(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """
+    Deliver every due email, batch by batch, over one reused mail connection.
+
+    If the mail server cannot be reached, the claimed batch counts as a
+    failed attempt, like a failed send, and draining stops until the next
+    run. Returns a ``(sent, failed)`` tuple of counts.
+    """
+    sent = failed = 0
+    connection = None
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            if connection is None:
+                try:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                except Exception as e:
+                    connection = None
+                    logger.error(f"Could not connect to the mail server: {str(e)}")
+                    for email in batch:
+                        record_failure(email, e, max_attempts=max_attempts)
+                    failed += len(batch)
+                    break
+            for email in batch:
+                if deliver(email, connection, max_attempts=max_attempts):
+                    sent += 1
+                else:
+                    failed += 1
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent, failed
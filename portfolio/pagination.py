@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET``, each page continues from the ordering values of the
+last row on the previous page, so fetching page 500 costs the same as page 1.
+Positions are passed around as opaque, URL-safe cursor tokens.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(values, backwards=False):
+    """Pack ordering ``values`` into an opaque token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    data = json.dumps({'v': payload, 'b': backwards}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a token from ``encode_cursor``, returning ``(values, backwards)``."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return data['v'], bool(data['b'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} items>'
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by keyset on ``ordering``.
+
+    ``ordering`` must end in a unique field (normally ``-id``) so every row
+    has a distinct position. With ``count_total`` set, ``count`` runs a
+    ``COUNT(*)``; otherwise it is ``None`` and no count query is made.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count_total=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_total = count_total
+        self._count = None
+
+    @property
+    def count(self):
+        if self.count_total and self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    def _fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def _cursor_for(self, obj, backwards):
+        return encode_cursor([getattr(obj, name) for name, _ in self._fields()], backwards)
+
+    def _after(self, values, backwards):
+        """Return a filter for rows after (or, ``backwards``, before) ``values``."""
+        fields = self._fields()
+        if len(values) != len(fields):
+            raise InvalidCursor('Invalid cursor.')
+        condition = Q()
+        for i, (name, descending) in enumerate(fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for j in range(i):
+                term &= Q(**{fields[j][0]: values[j]})
+            condition |= term
+        return condition
+
+    def page(self, cursor=None):
+        """Return the page starting at ``cursor`` (the first page if ``None``)."""
+        backwards = False
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            values, backwards = decode_cursor(cursor)
+            if backwards:
+                reversed_ordering = [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+                queryset = self.queryset.order_by(*reversed_ordering)
+            try:
+                queryset = queryset.filter(self._after(values, backwards))
+            except (ValueError, TypeError, ValidationError):
+                raise InvalidCursor('Invalid cursor.')
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, self)
+
+        if backwards:
+            next_cursor = self._cursor_for(rows[-1], False)
+            previous_cursor = self._cursor_for(rows[0], True) if has_more else None
+        else:
+            next_cursor = self._cursor_for(rows[-1], False) if has_more else None
+            previous_cursor = self._cursor_for(rows[0], True) if cursor else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
@@ -0,0 +1,218 @@
+"""
+Rate limiting for the public forms.
+
+Each client IP address and each submitted email address gets a token
+bucket per form: ``PORTFOLIO_RATE_LIMITS`` maps ``'ip'`` and ``'email'`` to
+``(burst, period)``, allowing ``burst`` submissions at once, refilled evenly
+over ``period`` seconds. A flood is answered with ``429 Too Many Requests``
+before the form is validated or the database touched.
+
+Buckets live in the ``PORTFOLIO_RATE_LIMIT_CACHE`` cache (``'default'``)
+and are updated only with atomic ``incr``/``decr``, so a refused request
+costs no database query, as a generic cell rate algorithm: the bucket is a
+single "theoretical arrival time" that each request pushes one interval
+further into the future, and a request is refused once that time runs more
+than ``burst`` intervals ahead of the clock. This is equivalent to a token
+bucket without any read-modify-write race between workers.
+
+That only holds when every worker shares the cache and ``incr`` is atomic,
+as with Redis or Memcached; file and database caches read and rewrite the
+value. On any other backend the limiter stays off (and check
+``portfolio.W002`` says so), except for the local memory cache under
+``DEBUG``, where a single development process is all there is.
+
+Allowed and rejected submissions are counted in the cache too; see
+``get_stats()`` and the ``rate_limit_stats`` command.
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+logger = logging.getLogger('portfolio')
+
+BUCKET_KEY = 'portfolio:ratelimit:{}:{}:{}'
+STATS_KEY = 'portfolio:ratelimit:stats:{}:{}'
+
+# Idle buckets are full again after ``period``; the timeout only bounds how
+# long they occupy the cache.
+BUCKET_TIMEOUT = 60 * 60 * 24
+
+DEFAULT_LIMITS = {
+    'ip': (5, 60 * 60),
+    'email': (3, 60 * 60),
+}
+
+OUTCOMES = ('allowed', 'rejected_ip', 'rejected_email')
+
+# Cache backends whose ``incr``/``decr`` are atomic across worker processes.
+ATOMIC_CACHES = {
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+}
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+# The ``rate_limit_scope`` of every limited view, for the statistics.
+SCOPES = ('contact', 'quote')
+
+
+def get_limits():
+    return getattr(settings, 'PORTFOLIO_RATE_LIMITS', DEFAULT_LIMITS) or {}
+
+
+def get_cache_alias():
+    return getattr(settings, 'PORTFOLIO_RATE_LIMIT_CACHE', 'default')
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def is_enabled():
+    """Whether limits are configured and the cache can keep the buckets safely."""
+    if not get_limits():
+        return False
+    backend = settings.CACHES.get(get_cache_alias(), {}).get('BACKEND', '')
+    return backend in ATOMIC_CACHES or (backend == LOCAL_CACHE and settings.DEBUG)
+
+
+def get_client_ip(request):
+    """
+    Return the client address to limit, from ``PORTFOLIO_CLIENT_IP_HEADER``
+    (e.g. ``'HTTP_X_REAL_IP'``, set by a trusted proxy) or ``REMOTE_ADDR``.
+    IPv6 clients are limited per /64, the block one host usually gets.
+    """
+    header = getattr(settings, 'PORTFOLIO_CLIENT_IP_HEADER', '')
+    value = (header and request.META.get(header)) or request.META.get('REMOTE_ADDR', '')
+    value = value.split(',')[0].strip()
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return value
+    if address.version == 6:
+        return str(ipaddress.ip_network(f'{address}/64', strict=False))
+    return str(address)
+
+
+def bucket_key(scope, kind, value):
+    # Hashed so any address or email makes a valid memcached key.
+    digest = hashlib.sha256(value.encode()).hexdigest()[:32]
+    return BUCKET_KEY.format(scope, kind, digest)
+
+
+def take(key, burst, period):
+    """
+    Take a token from the bucket at ``key``. Returns ``0`` if one was
+    available, otherwise the seconds until one will be.
+    """
+    cache = get_cache()
+    interval = get_interval(burst, period)
+    now = int(time.time() * 1000)
+    cache.add(key, now, BUCKET_TIMEOUT)
+    try:
+        arrival = cache.incr(key, interval)
+        if arrival < now + interval:
+            # The bucket has been idle, so it is full: restart from now.
+            arrival = cache.incr(key, now + interval - arrival)
+        overdue = arrival - now - burst * interval
+        if overdue > 0:
+            # Refused requests do not use up the bucket.
+            cache.decr(key, interval)
+            return math.ceil(overdue / 1000)
+    except ValueError:
+        # The bucket was evicted mid-update; let this one through.
+        pass
+    return 0
+
+
+def give_back(key, burst, period):
+    """Return a token taken by ``take()`` for a request refused by another limit."""
+    try:
+        get_cache().decr(key, get_interval(burst, period))
+    except ValueError:
+        pass
+
+
+def get_interval(burst, period):
+    """Milliseconds for one token to refill."""
+    return max(1, round(period * 1000 / burst))
+
+
+def record(scope, outcome):
+    key = STATS_KEY.format(scope, outcome)
+    cache = get_cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_stats(scopes=SCOPES):
+    """Return ``{scope: {outcome: count}}`` for the given form scopes."""
+    keys = {STATS_KEY.format(scope, outcome): (scope, outcome) for scope in scopes for outcome in OUTCOMES}
+    values = get_cache().get_many(keys)
+    stats = {scope: dict.fromkeys(OUTCOMES, 0) for scope in scopes}
+    for key, (scope, outcome) in keys.items():
+        stats[scope][outcome] = values.get(key, 0)
+    return stats
+
+
+def reset_stats(scopes=SCOPES):
+    get_cache().delete_many([STATS_KEY.format(scope, outcome) for scope in scopes for outcome in OUTCOMES])
+
+
+def check(request, scope):
+    """
+    Take a token from the submitting IP's and email's buckets for the
+    ``scope`` form. Returns ``None`` to go ahead, or the ``429`` response.
+    """
+    if not is_enabled():
+        return None
+    limits = get_limits()
+    taken = []
+    subjects = []
+    if 'ip' in limits:
+        subjects.append(('ip', get_client_ip(request)))
+    email = request.POST.get('email', '').strip().lower()
+    if 'email' in limits and email:
+        subjects.append(('email', email))
+
+    for kind, value in subjects:
+        key = bucket_key(scope, kind, value)
+        retry_after = take(key, *limits[kind])
+        if retry_after:
+            for taken_key, taken_kind in taken:
+                give_back(taken_key, *limits[taken_kind])
+            record(scope, f'rejected_{kind}')
+            logger.warning(f"Rate limited {scope} submission by {kind} (retry in {retry_after}s)")
+            return rate_limited_response(retry_after)
+        taken.append((key, kind))
+    record(scope, 'allowed')
+    return None
+
+
+def rate_limited_response(retry_after):
+    # Rendered without the request, so no context processor touches the database.
+    content = render_to_string('portfolio/rate_limited.html', {'retry_minutes': math.ceil(retry_after / 60)})
+    response = HttpResponse(content, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class RateLimitMixin:
+    """Refuse floods of POSTs to a form view; set ``rate_limit_scope`` to the form's name."""
+    rate_limit_scope = None
+
+    def post(self, request, *args, **kwargs):
+        response = check(request, self.rate_limit_scope)
+        if response is not None:
+            return response
+        return super().post(request, *args, **kwargs)
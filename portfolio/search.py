@@ -0,0 +1,190 @@
+"""
+Full-text search for portfolio items.
+
+Items are indexed into a side table kept up to date by the ``PortfolioItem``
+signals: an FTS5 virtual table on SQLite, or a ``tsvector`` column with a
+GIN index on PostgreSQL. Other databases fall back to ``icontains``
+filtering. Set ``PORTFOLIO_SEARCH_BACKEND`` to a dotted class path to force a
+particular backend; ``manage.py rebuild_search_index`` repopulates the index.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_terms(query):
+    """Split a user query into plain word terms, dropping any search syntax."""
+    return TERM_RE.findall(query.lower())
+
+
+class SimpleSearchBackend:
+    """Unindexed fallback that filters with ``icontains``."""
+
+    def install(self):
+        pass
+
+    def uninstall(self):
+        pass
+
+    def index(self, item):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def search(self, queryset, query):
+        """Filter ``queryset`` to items matching ``query``, annotated with ``search_rank``."""
+        filters = Q()
+        for term in get_terms(query):
+            filters &= Q(title__icontains=term) | Q(description__icontains=term)
+        return queryset.filter(filters).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteSearchBackend(SimpleSearchBackend):
+    """SQLite FTS5 index ranked with BM25, titles weighted above descriptions."""
+    table = 'portfolio_portfolioitem_fts'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "title, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        self.rebuild()
+
+    def uninstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, item):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [item.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, description) VALUES (%s, %s, %s)",
+                [item.pk, item.title, item.description],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [pk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, description) "
+                "SELECT id, title, description FROM portfolio_portfolioitem"
+            )
+            return cursor.rowcount
+
+    def search(self, queryset, query):
+        terms = get_terms(query)
+        if not terms:
+            return queryset.none()
+        # Quote every term and make it a prefix match: "term"*
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = self.table
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match])
+        ).annotate(search_rank=RawSQL(
+            f"SELECT -bm25({table}, 10.0, 1.0) FROM {table} "
+            f"WHERE {table} MATCH %s AND rowid = portfolio_portfolioitem.id",
+            [match],
+            output_field=FloatField(),
+        ))
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    """PostgreSQL ``tsvector`` index with a GIN index, ranked with ``ts_rank``."""
+    table = 'portfolio_portfolioitem_search'
+    config = 'english'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "item_id bigint PRIMARY KEY REFERENCES portfolio_portfolioitem (id) ON DELETE CASCADE, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx ON {self.table} USING GIN (document)"
+            )
+        self.rebuild()
+
+    def uninstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def _document_sql(self):
+        return (
+            f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'B')"
+        )
+
+    def index(self, item):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (item_id, document) VALUES (%s, {self._document_sql()}) "
+                "ON CONFLICT (item_id) DO UPDATE SET document = EXCLUDED.document",
+                [item.pk, item.title, item.description],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE item_id = %s", [pk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (item_id, document) "
+                f"SELECT id, setweight(to_tsvector('{self.config}', title), 'A') || "
+                f"setweight(to_tsvector('{self.config}', description), 'B') FROM portfolio_portfolioitem"
+            )
+            return cursor.rowcount
+
+    def search(self, queryset, query):
+        terms = get_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        table, config = self.table, self.config
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT item_id FROM {table} WHERE document @@ to_tsquery('{config}', %s)",
+            [tsquery],
+        )).annotate(search_rank=RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('{config}', %s)) FROM {table} "
+            f"WHERE item_id = portfolio_portfolioitem.id",
+            [tsquery],
+            output_field=FloatField(),
+        ))
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the search backend for the configured database."""
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PORTFOLIO_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connection.vendor, SimpleSearchBackend)
+        _backend = backend_class()
+    return _backend
@@ -0,0 +1,121 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .cache import invalidate
+from .images import IMAGE_FIELDS, process_image, update_image_metadata
+from .search import get_search_backend
+from .sitemaps import schedule_rebuild
+
+# Cache namespaces (see ``portfolio.cache``) built from each model's rows.
+CACHE_NAMESPACES = {
+    'portfolio.SiteSettings': ('site_settings', 'pages'),
+    'portfolio.ProfileImage': ('site_settings', 'pages', 'dashboard'),
+    'portfolio.GalleryImage': ('pages', 'dashboard'),
+    'portfolio.Package': ('pages', 'packages'),
+    'portfolio.Service': ('pages', 'services'),
+    'portfolio.ContactMessage': ('dashboard',),
+    'portfolio.PortfolioItem': ('pages',),
+    'portfolio.PortfolioImage': ('pages',),
+}
+
+
+def invalidate_model_caches(model):
+    """
+    Invalidate every cache and sitemap section built from ``model``.
+
+    Signal handlers call this automatically; call it directly after bulk
+    operations such as ``QuerySet.update()`` that bypass signals.
+    """
+    namespaces = CACHE_NAMESPACES.get(model._meta.label)
+    if namespaces:
+        invalidate(*namespaces)
+    schedule_rebuild(model)
+
+
+def _invalidate_handler(sender, **kwargs):
+    """Drop cached data derived from ``sender`` when a row is saved or deleted."""
+    invalidate_model_caches(sender)
+
+
+def _release(storage, name):
+    # After the commit, so a rolled back save or delete keeps its file.
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+def _make_image_handlers(field_name, counted):
+    """
+    Return the ``pre_save``, ``post_save`` and ``post_delete`` handlers of
+    an image field. ``counted`` is whether its storage counts references
+    (``ContentAddressedStorage``), which must be dropped with the image.
+    """
+    attribute = f'_previous_{field_name}'
+
+    def remember(sender, instance, raw=False, **kwargs):
+        """Note the image a row had before this save, and whether a new file is being uploaded."""
+        if raw:
+            return
+        fieldfile = getattr(instance, field_name)
+        previous = None
+        if not instance._state.adding:
+            previous = sender._default_manager.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        instance.__dict__[attribute] = (previous, not fieldfile._committed)
+
+    def saved(sender, instance, raw=False, **kwargs):
+        """Generate responsive derivatives and metadata whenever an image is uploaded or replaced."""
+        if raw:
+            return
+        previous, uploaded = instance.__dict__.pop(attribute, (None, False))
+        fieldfile = getattr(instance, field_name)
+        written = process_image(fieldfile)
+        # A different file has different metadata, even when its derivatives
+        # already existed (an identical file stored for another row).
+        update_image_metadata(
+            instance, field_name,
+            force=(previous or '') != fieldfile.name,
+            derivatives=bool(fieldfile) and written is not None,
+        )
+        # A newly uploaded file adds a reference even when its content, and
+        # so its name, is unchanged.
+        if counted and previous and (previous != fieldfile.name or uploaded):
+            _release(fieldfile.storage, previous)
+
+    def deleted(sender, instance, **kwargs):
+        """Drop a deleted row's image reference in content-addressed storage."""
+        fieldfile = getattr(instance, field_name)
+        if counted and fieldfile:
+            _release(fieldfile.storage, fieldfile.name)
+
+    return remember, saved, deleted
+
+
+def _index_portfolio_item(sender, instance, raw=False, **kwargs):
+    """Keep the search index in step with the saved item."""
+    if raw:
+        return
+    get_search_backend().index(instance)
+
+
+def _unindex_portfolio_item(sender, instance, **kwargs):
+    """Drop a deleted item from the search index."""
+    get_search_backend().remove(instance.pk)
+
+
+def connect_signals():
+    """Wire up the portfolio model signal handlers. Called from ``PortfolioConfig.ready``."""
+    for label, field_name in IMAGE_FIELDS:
+        model = apps.get_model(label)
+        counted = hasattr(model._meta.get_field(field_name).storage, 'add_reference')
+        remember, saved, deleted = _make_image_handlers(field_name, counted)
+        pre_save.connect(remember, sender=model, weak=False, dispatch_uid=f'portfolio_images_remember_{label}')
+        post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'portfolio_images_{label}')
+        post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f'portfolio_images_delete_{label}')
+
+    for label in CACHE_NAMESPACES:
+        model = apps.get_model(label)
+        post_save.connect(_invalidate_handler, sender=model, dispatch_uid=f'portfolio_cache_save_{label}')
+        post_delete.connect(_invalidate_handler, sender=model, dispatch_uid=f'portfolio_cache_delete_{label}')
+
+    portfolio_item = apps.get_model('portfolio.PortfolioItem')
+    post_save.connect(_index_portfolio_item, sender=portfolio_item, dispatch_uid='portfolio_search_index')
+    post_delete.connect(_unindex_portfolio_item, sender=portfolio_item, dispatch_uid='portfolio_search_unindex')
@@ -0,0 +1,271 @@
+"""
+Precomputed sitemaps.
+
+Sitemaps are rendered ahead of time into gzip files, one per section and
+page, plus a ``sitemap.xml`` index, all written atomically to
+``PORTFOLIO_SITEMAP_DIR``. Requests only ever serve those files. When rows a
+section is built from change, the model signals only mark that section
+dirty once the transaction commits, so saving in the admin never waits on
+a rebuild; ``manage.py build_sitemaps --pending``, run periodically,
+rebuilds the dirty sections, however many changes each has seen, and
+``manage.py build_sitemaps`` rebuilds everything, e.g. after deploying.
+"""
+import gzip
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import NoReverseMatch, reverse
+
+from .models import GalleryImage, Package, PortfolioItem, ProfileImage
+
+logger = logging.getLogger('portfolio')
+
+INDEX_FILENAME = 'sitemap.xml'
+SECTION_FILENAME = 'sitemap-{}-{}.xml.gz'
+# Hidden, so it never matches a sitemap URL.
+DIRTY_FILENAME = '.dirty-{}'
+DIRTY_FILENAME_RE = re.compile(r'^\.dirty-([a-z]+)$')
+SECTION_FILENAME_RE = re.compile(r'^sitemap-([a-z]+)-(\d+)\.xml\.gz$')
+
+
+class PageSitemap(Sitemap):
+    """The fixed public pages, with the images each one shows."""
+    changefreq = 'weekly'
+
+    pages = {
+        'home': 1.0,
+        'about': 0.8,
+        'packages': 0.8,
+        'contact': 0.5,
+    }
+
+    def items(self):
+        return list(self.pages)
+
+    def location(self, item):
+        return reverse(item)
+
+    def priority(self, item):
+        return self.pages[item]
+
+    def images(self, item):
+        if item == 'home':
+            return [
+                (image.image, image.alt_text or image.title)
+                for image in GalleryImage.objects.filter(is_active=True).order_by('order')
+            ]
+        if item == 'about':
+            return [
+                (image.image, image.title)
+                for image in ProfileImage.objects.filter(is_active=True).order_by('-created_at')
+            ]
+        if item == 'packages':
+            return [
+                (package.image, package.name)
+                for package in Package.objects.filter(is_active=True).exclude(image='').order_by('category', 'name')
+            ]
+        return []
+
+
+class PortfolioSitemap(Sitemap):
+    """Published portfolio items, with their main and additional images."""
+    changefreq = 'monthly'
+    priority = 0.6
+
+    def items(self):
+        return PortfolioItem.objects.filter(published=True).order_by('-created_at', '-id').prefetch_related('images')
+
+    def lastmod(self, item):
+        return item.updated_at
+
+    def images(self, item):
+        images = [(item.main_image, item.title)] if item.main_image else []
+        images.extend((image.image, image.caption or item.title) for image in item.images.all())
+        return images
+
+
+def portfolio_routed():
+    """The portfolio pages are only in the sitemap when they are routed."""
+    try:
+        reverse('portfolio:list')
+    except NoReverseMatch:
+        return False
+    return True
+
+
+def get_sitemaps():
+    """Return the ``{section: Sitemap}`` to build."""
+    sitemaps = {'pages': PageSitemap()}
+    if portfolio_routed():
+        sitemaps['portfolio'] = PortfolioSitemap()
+    return sitemaps
+
+
+# Sections to rebuild when a model's rows change.
+MODEL_SECTIONS = {
+    'portfolio.GalleryImage': ('pages',),
+    'portfolio.ProfileImage': ('pages',),
+    'portfolio.Package': ('pages',),
+    'portfolio.PortfolioItem': ('portfolio',),
+    'portfolio.PortfolioImage': ('portfolio',),
+}
+
+
+def get_sitemap_dir():
+    return getattr(settings, 'PORTFOLIO_SITEMAP_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'sitemaps')
+
+
+def get_site():
+    """Return the ``(protocol, domain)`` sitemap URLs are built on."""
+    domain = getattr(settings, 'PORTFOLIO_SITE_DOMAIN', None) or Site.objects.get_current().domain
+    return getattr(settings, 'PORTFOLIO_SITEMAP_PROTOCOL', 'https'), domain
+
+
+def _write(filename, content, compress=False):
+    """Write ``content`` to the sitemap directory, replacing any old file in one step."""
+    directory = get_sitemap_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if compress:
+                # mtime=0 keeps the output byte-identical for identical content.
+                with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+                    gz.write(content.encode())
+            else:
+                f.write(content.encode())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(directory, filename))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _section_files(section):
+    directory = get_sitemap_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if (match := SECTION_FILENAME_RE.match(name)) and match.group(1) == section
+    )
+
+
+def build_section(section, sitemap, protocol, domain):
+    """
+    Render every page of ``sitemap`` to the gzip files of ``section``, or
+    remove the section's files if ``sitemap`` is ``None``. Returns the
+    number of URLs written.
+    """
+    stale = set(_section_files(section))
+    base_url = f'{protocol}://{domain}'
+    site = Site(domain=domain, name=domain)
+    count = 0
+    for page in (sitemap.paginator.page_range if sitemap is not None else ()):
+        urls = sitemap.get_urls(page=page, site=site, protocol=protocol)
+        for url in urls:
+            url['images'] = [
+                {'location': urljoin(base_url, fieldfile.url), 'title': title}
+                for fieldfile, title in sitemap.images(url['item'])
+                if fieldfile
+            ]
+        filename = SECTION_FILENAME.format(section, page)
+        _write(filename, render_to_string('portfolio/sitemap.xml', {'urlset': urls}), compress=True)
+        stale.discard(filename)
+        count += len(urls)
+    for name in stale:
+        os.remove(os.path.join(get_sitemap_dir(), name))
+    return count
+
+
+def build_index(protocol, domain):
+    """Write ``sitemap.xml`` listing every section file currently on disk."""
+    base_url = f'{protocol}://{domain}'
+    directory = get_sitemap_dir()
+    entries = []
+    for section in get_sitemaps():
+        for name in _section_files(section):
+            modified = os.path.getmtime(os.path.join(directory, name))
+            entries.append({
+                'location': f'{base_url}/{name}',
+                'last_mod': datetime.fromtimestamp(modified, tz=dt_timezone.utc),
+            })
+    _write(INDEX_FILENAME, render_to_string('sitemap_index.xml', {'sitemaps': entries}))
+
+
+def build(sections=None):
+    """Rebuild ``sections`` (all of them by default) and the index. Returns ``{section: urls}``."""
+    protocol, domain = get_site()
+    sitemaps = get_sitemaps()
+    sections = list(sections or sitemaps)
+    # Cleared first, so changes made during the build mark them again.
+    clear_dirty(sections)
+    counts = {}
+    try:
+        for section in sections:
+            counts[section] = build_section(section, sitemaps.get(section), protocol, domain)
+        build_index(protocol, domain)
+    except BaseException:
+        mark_dirty(sections)
+        raise
+    return counts
+
+
+def build_pending():
+    """Rebuild the sections marked dirty, if any. Returns ``{section: urls}``."""
+    sections = dirty_sections()
+    return build(sections) if sections else {}
+
+
+def _dirty_path(section):
+    return os.path.join(get_sitemap_dir(), DIRTY_FILENAME.format(section))
+
+
+def mark_dirty(sections):
+    """Flag ``sections`` for the next ``build_pending()``."""
+    os.makedirs(get_sitemap_dir(), exist_ok=True)
+    for section in sections:
+        with open(_dirty_path(section), 'a'):
+            pass
+
+
+def clear_dirty(sections):
+    for section in sections:
+        try:
+            os.remove(_dirty_path(section))
+        except FileNotFoundError:
+            pass
+
+
+def dirty_sections():
+    directory = get_sitemap_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(match.group(1) for name in os.listdir(directory) if (match := DIRTY_FILENAME_RE.match(name)))
+
+
+def schedule_rebuild(model):
+    """
+    Mark the sections built from ``model`` dirty once the current
+    transaction commits, for ``build_sitemaps --pending`` to rebuild.
+    """
+    sections = MODEL_SECTIONS.get(model._meta.label, ())
+    if not sections or not getattr(settings, 'PORTFOLIO_SITEMAP_AUTO_REBUILD', True):
+        return
+
+    def mark():
+        try:
+            mark_dirty(sections)
+        except OSError as e:
+            logger.error(f"Failed to mark sitemap sections {', '.join(sections)} for rebuilding: {str(e)}")
+
+    transaction.on_commit(mark)
@@ -0,0 +1,249 @@
+"""
+Static and media file storage.
+
+``collectstatic`` minifies the CSS and JavaScript, gives every file a
+content-hashed name listed in ``staticfiles.json`` and writes gzip and
+Brotli copies next to it. WhiteNoise serves the hashed names with a
+far-future ``Cache-Control: immutable``, so browsers never ask for them
+again; a changed file gets a new name.
+
+Uploaded images go to ``STORAGES['media']``, by default
+``ContentAddressedStorage``: each file is named after the SHA-256 of its
+bytes, so an identical upload is stored once however many rows use it, and
+its URL can be cached forever. ``StoredFile`` rows count the references;
+the file goes when the last row using it is deleted or given a new image.
+Files left without a ``StoredFile`` row, by a rolled back upload or a
+crash, are swept up by the ``prune_media`` command.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage, storages
+from django.db import transaction
+from django.db.models import F
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+logger = logging.getLogger('portfolio')
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+
+def get_project_dirs():
+    """Return the ``STATICFILES_DIRS`` locations, whose files are minified."""
+    return [d[1] if isinstance(d, (list, tuple)) else d for d in settings.STATICFILES_DIRS]
+
+
+def get_minifiers():
+    """Return ``{extension: minify}`` for the minifiers that are installed."""
+    minifiers = {}
+    if not getattr(settings, 'PORTFOLIO_MINIFY_STATIC', True):
+        return minifiers
+    if rcssmin is not None:
+        minifiers['.css'] = rcssmin.cssmin
+    if rjsmin is not None:
+        minifiers['.js'] = rjsmin.jsmin
+    return minifiers
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Minifying, hashing and precompressing static storage."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            # Minify the collected copies of the project's own files, then
+            # hash and compress those copies rather than the sources.
+            minifiers = get_minifiers()
+            for path, (storage, source_path) in list(paths.items()):
+                if self.is_project_file(storage) and self.minify(path, minifiers):
+                    paths[path] = (self, path)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def is_project_file(self, storage):
+        """Third-party assets (the admin's, ...) are shipped as their authors intended."""
+        location = os.path.abspath(getattr(storage, 'location', ''))
+        return any(location == os.path.abspath(directory) for directory in get_project_dirs())
+
+    def minify(self, path, minifiers):
+        """
+        Minify the collected ``path`` in place. Returns whether the copy is
+        minified, including copies left over from an earlier run.
+        """
+        minify = next((m for ext, m in minifiers.items() if path.endswith(ext)), None)
+        if minify is None or path.endswith(('.min.css', '.min.js')):
+            return False
+        with self.open(path) as f:
+            original = f.read().decode()
+        minified = minify(original)
+        if minified == original:
+            return True
+        self.delete(path)
+        self._save(path, ContentFile(minified.encode()))
+        logger.debug(f"Minified {path}: {len(original)} -> {len(minified)} bytes")
+        return True
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Without a manifest collectstatic has not been run (development,
+            # tests); serve the unhashed name instead of failing every page.
+            if self.hashed_files:
+                raise
+            return name
+
+
+CONTENT_DIR = 'content'
+
+CONTENT_NAME_RE = re.compile(rf'^{CONTENT_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.[a-z0-9]+)?$')
+
+
+def is_content_name(name):
+    """Whether ``name`` is a content-addressed original, whose bytes never change."""
+    return bool(CONTENT_NAME_RE.match(name or ''))
+
+
+def media_storage():
+    """Storage of the models' image fields: ``STORAGES['media']``, or the default storage."""
+    if 'media' in settings.STORAGES:
+        return storages['media']
+    return default_storage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file once, as ``content/ab/cd/<sha256>.<ext>``.
+
+    ``save()`` ignores the requested name except for its extension and adds
+    a reference to the file; ``delete()`` drops one, and only the last
+    removes the file together with its image derivatives, once the
+    transaction commits. Code that copies a stored name to another row must
+    call ``add_reference()`` for it.
+
+    Names outside ``content/`` (files from before content addressing, see
+    ``convert_media_storage``) carry no count, so ``delete()`` leaves them
+    alone: another row may still use them.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        temp_path, digest, size = self._spool(content)
+        name = self.content_name(digest, name)
+        try:
+            with transaction.atomic():
+                stored = self._lock(name, size)
+                if not self.exists(name):
+                    os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+                    os.replace(temp_path, self.path(name))
+                    if self.file_permissions_mode is not None:
+                        os.chmod(self.path(name), self.file_permissions_mode)
+                type(stored)._default_manager.filter(pk=stored.pk).update(references=F('references') + 1)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def _spool(self, content):
+        """Copy ``content`` to a temporary file beside the store, hashing it on the way."""
+        # Under a hidden directory of the same file system, so the final move
+        # is atomic and the media view never serves a partial file.
+        directory = os.path.join(self.location, '.incoming')
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+        return temp.name, digest.hexdigest(), size
+
+    def content_name(self, digest, name):
+        extension = os.path.splitext(name or '')[1].lower()
+        if not re.match(r'^\.[a-z0-9]{1,10}$', extension):
+            extension = ''
+        return f'{CONTENT_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def _lock(self, name, size):
+        stored_file = apps.get_model('portfolio', 'StoredFile')
+        stored, _ = stored_file.objects.select_for_update().get_or_create(name=name, defaults={'size': size})
+        return stored
+
+    def add_reference(self, name):
+        """Record another row using the already stored ``name``."""
+        if is_content_name(name):
+            with transaction.atomic():
+                stored = self._lock(name, self.size(name))
+                type(stored)._default_manager.filter(pk=stored.pk).update(references=F('references') + 1)
+
+    def delete(self, name):
+        """
+        Drop one reference to ``name``; the last one deletes the file and its
+        derivatives after the transaction commits, so a rollback keeps them.
+        """
+        if not is_content_name(name):
+            logger.info(f"Not deleting {name}: it is not content-addressed, so other rows may use it")
+            return
+        stored_file = apps.get_model('portfolio', 'StoredFile')
+        with transaction.atomic():
+            stored = stored_file.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                # Not saved through this storage; whoever uses it is unknown.
+                logger.warning(f"Not deleting untracked media file {name}")
+                return
+            if stored.references > 1:
+                stored_file.objects.filter(pk=stored.pk).update(references=F('references') - 1)
+                return
+            stored.delete()
+        transaction.on_commit(lambda: self.delete_file(name))
+
+    def delete_file(self, name):
+        """Remove ``name`` and its derivatives from disk unless it has been stored again since."""
+        stored_file = apps.get_model('portfolio', 'StoredFile')
+        if stored_file.objects.filter(name=name).exists():
+            return
+        self.delete_derivatives(name)
+        super().delete(name)
+        logger.info(f"Deleted unreferenced media file {name}")
+
+    def delete_derivatives(self, name):
+        directory, filename = os.path.split(name)
+        prefix = os.path.splitext(filename)[0] + '_'
+        storage = self.derivative_storage
+        if not storage.exists(directory):
+            return
+        for derivative in storage.listdir(directory)[1]:
+            if derivative.startswith(prefix):
+                storage.delete(f'{directory}/{derivative}')
+
+    @property
+    def derivative_storage(self):
+        """
+        Plain storage over the same files, for the image derivatives, which
+        are named after their original rather than their own content.
+        """
+        return FileSystemStorage(
+            location=self.location,
+            base_url=self.base_url,
+            file_permissions_mode=self.file_permissions_mode,
+            directory_permissions_mode=self.directory_permissions_mode,
+        )
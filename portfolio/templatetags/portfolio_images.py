@@ -0,0 +1,116 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from portfolio.images import MIME_TYPES, derivative_name, derivative_widths, get_formats
+
+register = template.Library()
+
+DEFAULT_SIZES = '100vw'
+
+
+def image_size(fieldfile):
+    """Return the recorded ``(width, height)`` of an image, or ``(None, None)``."""
+    instance, name = fieldfile.instance, fieldfile.field.name
+    return getattr(instance, f'{name}_width', None), getattr(instance, f'{name}_height', None)
+
+
+def has_derivatives(fieldfile):
+    """
+    Whether an image's derivatives have been written, as the pipeline records
+    in ``<field>_derivatives``. Their widths depend on the original's, so
+    that must be known too; anything else is offered as-is.
+    """
+    instance, name = fieldfile.instance, fieldfile.field.name
+    return getattr(instance, f'{name}_derivatives', False) and image_size(fieldfile)[0] is not None
+
+
+@register.filter
+def srcset(fieldfile, fmt='jpeg'):
+    """
+    Return the ``srcset`` value listing every ``fmt`` derivative of an image.
+
+    Derivatives are never upscaled, so the widths past the original's
+    collapse into one candidate at its true width. Empty until the
+    derivatives have been written.
+
+    Usage: ``<img src="{{ image.image.url }}" srcset="{{ image.image|srcset:'webp' }}">``
+    """
+    if not fieldfile or not has_derivatives(fieldfile):
+        return ''
+    storage = fieldfile.storage
+    original_width, _ = image_size(fieldfile)
+    candidates = []
+    for width in derivative_widths(original_width):
+        url = storage.url(derivative_name(fieldfile.name, width, fmt))
+        candidates.append(f"{url} {min(width, original_width)}w")
+    return ', '.join(candidates)
+
+
+@register.filter
+def placeholder_style(fieldfile):
+    """
+    Return an inline ``style`` showing the image's placeholder and dominant
+    colour as its background until the image loads, or ``''`` if it has none.
+
+    Usage: ``<img src="{{ item.main_image.url }}" class="lqip" style="{{ item.main_image|placeholder_style }}">``
+    """
+    if not fieldfile:
+        return ''
+    instance, name = fieldfile.instance, fieldfile.field.name
+    placeholder = getattr(instance, f'{name}_placeholder', '')
+    color = getattr(instance, f'{name}_color', '')
+    style = []
+    if color:
+        style.append(f'background-color: {color}')
+    if placeholder:
+        style.append(f'background-image: url({placeholder}); background-size: cover; background-position: center')
+    return '; '.join(style)
+
+
+@register.simple_tag
+def responsive_image(fieldfile, alt='', sizes=DEFAULT_SIZES, **attrs):
+    """
+    Render a ``<picture>`` element offering every derivative format of an image.
+
+    The browser picks the first ``<source>`` type it supports and the best
+    width for ``sizes``; the inner ``<img>`` keeps the original as ``src`` for
+    anything that ignores ``srcset``. Extra keyword arguments become
+    attributes of the ``<img>``, e.g.
+    ``{% responsive_image image.image alt=image.alt_text sizes="33vw" class="img-fluid" %}``.
+    The image's recorded size becomes its ``width`` and ``height``, so the
+    page does not shift as it loads, and its placeholder, if any, is inlined
+    as its background and cleared by ``main.js`` once the image has loaded.
+    Until its derivatives have been written, the image renders as a plain
+    ``<img>`` of the original.
+    """
+    if not fieldfile:
+        return ''
+
+    img_attrs = {'loading': 'lazy', 'decoding': 'async'}
+    width, height = image_size(fieldfile)
+    if width and height:
+        img_attrs.update(width=width, height=height)
+    img_attrs.update(attrs)
+    style = placeholder_style(fieldfile)
+    if style:
+        img_attrs['class'] = f"{img_attrs.get('class', '')} lqip".strip()
+        img_attrs['style'] = f"{style}; {img_attrs['style']}" if img_attrs.get('style') else style
+    if not has_derivatives(fieldfile):
+        return format_html('<img src="{}" alt="{}"{}>', fieldfile.url, alt, flatatt(img_attrs))
+
+    *modern, fallback = get_formats()
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset(fieldfile, fmt), sizes) for fmt in modern),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}"{}></picture>',
+        sources,
+        fieldfile.url,
+        srcset(fieldfile, fallback),
+        sizes,
+        alt,
+        flatatt(img_attrs),
+    )
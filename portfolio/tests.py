@@ -1,3 +1,1372 @@
-from django.test import TestCase
-
-# Create your tests here.
+import io
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from elsy_portfolio.urls import urlpatterns as site_urlpatterns
+from . import outbox, ratelimit
+from .pagination import encode_cursor
+from .search import get_search_backend
+from .sitemaps import build, dirty_sections, get_sitemap_dir
+from .uploads import (
+    UploadError, complete_chunked_uploads, create_gallery_images, part_path, sweep_parts, write_chunk
+)
+from .cache import get_shared, page_cache_key
+from .custom_admin import DASHBOARD_CACHE_TIMEOUT, portfolio_admin_site
+from .images import derivative_name, generate_derivatives, get_formats, process_file
+from .checks import check_media_offload, check_rate_limit_cache, check_shared_cache
+from .media import serve_media
+from .storage import media_storage
+from .benchmark import get_urls, seed
+from .models import (
+    ContactMessage, GalleryImage, OutboxEmail, Package, PortfolioItem, ProfileImage, StoredFile
+)
+
+# Every test request would otherwise add a line to the console.
+logging.getLogger('portfolio.requests').setLevel(logging.WARNING)
+# As would every form submission and refused request.
+logging.getLogger('portfolio.views').setLevel(logging.WARNING)
+logging.getLogger('django.request').setLevel(logging.ERROR)
+
+# The portfolio list/detail URLs are disabled on the live site; mount them
+# here so their queries are covered too.
+urlpatterns = site_urlpatterns + [
+    path('portfolio/', include('portfolio.urls')),
+]
+
+# Run on a private per-process cache rather than the site's shared cache
+# directory, so nothing leaks between runs or into the running site.
+test_caches = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'portfolio-tests'},
+})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked with SQLite EXPLAIN QUERY PLAN.')
+@override_settings(ROOT_URLCONF='portfolio.tests', PORTFOLIO_PAGE_CACHE=False)
+class QueryPlanTests(TestCase):
+    """Fail when any query behind a public view has to scan a whole table."""
+
+    # Tables that may be scanned: the single-row settings table.
+    SCAN_ALLOWED = {'portfolio_sitesettings'}
+
+    @classmethod
+    def setUpTestData(cls):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            seed()
+
+    def setUp(self):
+        cache.clear()
+
+    def full_scans(self, sql):
+        """
+        Return the plan steps of ``sql`` that read a whole table or index.
+        ``SEARCH`` steps are fine. Walking an index (``SCAN ... USING
+        INDEX``) is only allowed when a ``LIMIT`` stops it early, or when the
+        index is partial, so it holds just the rows the query asked for.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        limited = ' LIMIT ' in sql
+        partial = {
+            index.name for model in apps.get_models() for index in model._meta.indexes if index.condition is not None
+        }
+        scans = []
+        for detail in details:
+            if not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail:
+                continue
+            match = re.search(r' USING (?:COVERING )?INDEX (\w+)', detail)
+            if match and (limited or match.group(1) in partial):
+                continue
+            table = detail.split()[1]
+            if table not in self.SCAN_ALLOWED and table != 'CONSTANT':
+                scans.append(detail)
+        return scans
+
+    def assertNoFullScans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            scans = self.full_scans(sql)
+            self.assertFalse(scans, f'{url} runs a full table scan ({", ".join(scans)}):\n{sql}')
+
+    def test_home(self):
+        self.assertNoFullScans('/')
+
+    def test_about(self):
+        self.assertNoFullScans('/about/')
+
+    def test_packages(self):
+        self.assertNoFullScans('/packages/')
+
+    def test_contact(self):
+        self.assertNoFullScans('/contact/')
+
+    def test_portfolio_list(self):
+        self.assertNoFullScans('/portfolio/')
+        self.assertNoFullScans('/portfolio/?category=modelling')
+        self.assertNoFullScans('/portfolio/?q=fashion')
+
+    def test_portfolio_detail(self):
+        item = PortfolioItem.objects.filter(published=True).order_by('created_at')[2]
+        self.assertNoFullScans(item.get_absolute_url())
+
+
+# Queries each page may run with the page cache off and every cached value
+# rebuilt, including the conditional GET validators. Admin changelists not
+# listed here share ADMIN_CHANGELIST_BUDGET.
+QUERY_BUDGETS = {
+    'home': 3,
+    'about': 2,
+    'packages': 3,
+    'contact': 2,
+    'portfolio:list': 4,
+    'portfolio:list:search': 4,
+    'portfolio:detail': 7,
+    'admin:index': 3,
+    'portfolio_admin:index': 9,
+    # The singleton add/delete permission checks each run an exists() query.
+    'portfolio_admin:portfolio_sitesettings_changelist': 9,
+}
+ADMIN_CHANGELIST_BUDGET = 7
+
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def call_site():
+    """
+    Return the innermost frames that issued the current query, skipping the
+    ORM itself, as ``path:line in function`` strings.
+    """
+    sites = []
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        path = frame.filename.replace('\\', '/')
+        if '/django/db/' in path or path == __file__:
+            continue
+        if path.startswith(PROJECT_DIR):
+            path = path[len(PROJECT_DIR) + 1:]
+        elif '/site-packages/' in path:
+            path = path.split('/site-packages/', 1)[1]
+        sites.append(f'{path}:{frame.lineno} in {frame.name}')
+        if len(sites) == 3:
+            break
+    return sites
+
+
+class QueryRecorder:
+    """Database execute wrapper that records each query's SQL and call site."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, call_site()))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def format(self, only=None):
+        lines = []
+        for sql, sites in self.queries:
+            if only is None or sql in only:
+                lines.append(sql)
+                lines.extend(f'    at {site}' for site in sites)
+        return '\n'.join(lines)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests', PORTFOLIO_PAGE_CACHE=False)
+class QueryBudgetTests(TestCase):
+    """
+    Hold every public page, admin index and admin changelist to its query
+    budget, and fail if its query count grows with the amount of data.
+    """
+
+    SMALL, LARGE = 1, 3
+
+    def record(self, scale):
+        """Seed a dataset of ``scale`` and return a ``QueryRecorder`` per URL name."""
+        recorders = {}
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+            user = seed(scale=scale)
+            anonymous, staff = Client(), Client()
+            staff.force_login(user)
+            for name, url, as_admin in get_urls():
+                if name.endswith('_change'):
+                    continue
+                cache.clear()
+                recorder = QueryRecorder()
+                with connection.execute_wrapper(recorder):
+                    response = (staff if as_admin else anonymous).get(url)
+                self.assertEqual(response.status_code, 200, url)
+                recorders[name] = recorder
+            transaction.set_rollback(True)
+        return recorders
+
+    def test_query_budgets(self):
+        small = self.record(self.SMALL)
+        large = self.record(self.LARGE)
+        for name, recorder in large.items():
+            with self.subTest(name):
+                budget = QUERY_BUDGETS.get(name, ADMIN_CHANGELIST_BUDGET)
+                self.assertLessEqual(
+                    len(recorder), budget,
+                    f'{name} ran {len(recorder)} queries, over its budget of {budget}:\n{recorder.format()}',
+                )
+                # A statement repeated more often on more data is an N+1 loop.
+                before = Counter(sql for sql, _ in small[name].queries)
+                after = Counter(sql for sql, _ in recorder.queries)
+                repeated = {sql for sql, count in after.items() if count > max(1, before[sql])}
+                self.assertFalse(
+                    repeated,
+                    f'{name} ran {len(small[name])} queries on the small dataset but {len(recorder)} '
+                    f'on the large one (N+1):\n{recorder.format(only=repeated)}',
+                )
+
+
+def jpeg(name, size, color):
+    """Return an uploaded JPEG of one ``color``."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG', quality=90)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class MediaRootMixin:
+    """Give each test an empty ``MEDIA_ROOT`` of its own."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ImageMetadataTests(MediaRootMixin, TestCase):
+    def test_replacing_with_an_already_stored_file_refreshes_metadata(self):
+        red = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        other = ProfileImage.objects.create(title='Green', image=jpeg('green.jpg', (300, 900), (0, 255, 0)))
+
+        # Same bytes as the first image, so its derivatives already exist.
+        other.image = jpeg('again.jpg', (800, 600), (255, 0, 0))
+        other.save()
+
+        other.refresh_from_db()
+        red.refresh_from_db()
+        self.assertEqual(other.image.name, red.image.name)
+        self.assertEqual((other.image_width, other.image_height), (800, 600))
+        self.assertEqual(other.image_color, red.image_color)
+        self.assertEqual(other.image_placeholder, red.image_placeholder)
+
+
+class ImageCommandTests(MediaRootMixin, TestCase):
+    KEY = 'portfolio.GalleryImage.image'
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.media_root, 'progress.json')
+        self.images = [
+            GalleryImage.objects.create(title=f'Photo {i}', image=jpeg(f'{i}.jpg', (400, 300), (i * 40, 0, 0)))
+            for i in range(6)
+        ]
+
+    def process(self, *args, **options):
+        out = io.StringIO()
+        call_command(
+            'process_images', *args, workers=1, checkpoint=self.checkpoint, stdout=out, **options,
+        )
+        return out.getvalue()
+
+    def processed(self, *args, **options):
+        """Run process_images and return the names of the images it handed to the pipeline."""
+        with mock.patch(
+            'portfolio.management.commands.process_images.process_file', wraps=process_file
+        ) as spy:
+            self.process(*args, **options)
+        return [call.args[2] for call in spy.call_args_list]
+
+    def names(self, images):
+        return [image.image.name for image in images]
+
+    def test_interrupted_run_resumes_after_the_last_saved_batch(self):
+        calls = []
+
+        def interrupt(*args):
+            calls.append(args)
+            if len(calls) == 6:
+                raise KeyboardInterrupt
+            return process_file(*args)
+
+        with mock.patch('portfolio.management.commands.process_images.process_file', side_effect=interrupt):
+            with self.assertRaisesMessage(CommandError, 'Interrupted'):
+                self.process(model=['GalleryImage'], batch_size=2)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['done'], {self.KEY: self.images[1].pk})
+
+        out = io.StringIO()
+        with mock.patch(
+            'portfolio.management.commands.process_images.process_file', wraps=process_file
+        ) as spy:
+            call_command(
+                'process_images', model=['GalleryImage'], batch_size=2, workers=1,
+                checkpoint=self.checkpoint, stdout=out,
+            )
+        self.assertIn('Resuming', out.getvalue())
+        self.assertEqual([call.args[2] for call in spy.call_args_list], self.names(self.images[2:]))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_for_other_options_is_ignored(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'run': {'fields': ['elsewhere'], 'since': None, 'force': False}, 'done': {}}, f)
+        self.assertEqual(self.processed(model=['GalleryImage']), self.names(self.images))
+
+    def test_model_and_since_select_rows(self):
+        profile = ProfileImage.objects.create(title='Portrait', image=jpeg('me.jpg', (400, 300), (0, 0, 255)))
+        self.assertEqual(self.processed(model=['ProfileImage']), [profile.image.name])
+
+        GalleryImage.objects.filter(pk__in=[image.pk for image in self.images[:4]]).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.processed(model=['GalleryImage'], since=since), self.names(self.images[4:]))
+
+        with self.assertRaisesMessage(CommandError, 'Unknown model'):
+            self.process(model=['Nothing'])
+        with self.assertRaisesMessage(CommandError, 'Invalid --since'):
+            self.process(since='last week')
+
+    def test_dry_run_writes_nothing(self):
+        GalleryImage.objects.update(image_width=None, image_derivatives=False)
+        with mock.patch('portfolio.management.commands.process_images.process_file') as spy:
+            out = self.process(model=['GalleryImage'], dry_run=True)
+        self.assertIn(f'Would process 6 {self.KEY} images.', out)
+        spy.assert_not_called()
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertFalse(GalleryImage.objects.exclude(image_width=None).exists())
+
+    def test_fills_in_missing_metadata_and_derivatives(self):
+        image = self.images[0]
+        storage = image.image.storage.derivative_storage
+        # The last derivative written, as if an earlier run had stopped short of it.
+        storage.delete(derivative_name(image.image.name, 640, 'jpeg'))
+        GalleryImage.objects.filter(pk=image.pk).update(image_width=None, image_placeholder='', image_derivatives=False)
+
+        self.process(model=['GalleryImage'])
+        image.refresh_from_db()
+        self.assertEqual(image.image_width, 400)
+        self.assertTrue(image.image_placeholder)
+        self.assertTrue(image.image_derivatives)
+        self.assertTrue(storage.exists(derivative_name(image.image.name, 640, 'jpeg')))
+
+    def test_backfill_writes_derivatives_before_recording_dimensions(self):
+        image = self.images[0]
+        storage = image.image.storage.derivative_storage
+        for fmt in get_formats():
+            storage.delete(derivative_name(image.image.name, 320, fmt))
+            storage.delete(derivative_name(image.image.name, 640, fmt))
+        GalleryImage.objects.filter(pk=image.pk).update(image_width=None, image_height=None, image_derivatives=False)
+
+        out = io.StringIO()
+        call_command('backfill_image_dimensions', workers=2, stdout=out)
+        self.assertIn('Recorded dimensions of 1 images.', out.getvalue())
+        image.refresh_from_db()
+        self.assertEqual((image.image_width, image.image_height), (400, 300))
+        self.assertTrue(image.image_derivatives)
+        for fmt in get_formats():
+            self.assertTrue(storage.exists(derivative_name(image.image.name, 640, fmt)))
+
+    def test_backfill_leaves_derivatives_unflagged_when_they_fail(self):
+        image = self.images[0]
+        GalleryImage.objects.filter(pk=image.pk).update(image_width=None, image_derivatives=False)
+        with self.assertLogs('portfolio', level='ERROR'):
+            with mock.patch('portfolio.images.generate_derivatives', side_effect=OSError('Disk full')):
+                call_command('backfill_image_dimensions', stdout=io.StringIO())
+        image.refresh_from_db()
+        self.assertEqual(image.image_width, 400)
+        self.assertFalse(image.image_derivatives)
+
+
+class UnreachableBackend(BaseEmailBackend):
+    """A mail backend whose server cannot be reached."""
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+    def send_messages(self, email_messages):
+        self.open()
+
+
+class RejectingBackend(BaseEmailBackend):
+    """A mail backend that refuses every message."""
+    def send_messages(self, email_messages):
+        raise OSError('Recipient refused')
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests', PORTFOLIO_PAGE_CACHE=False)
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_contact_message_and_email_are_saved_together(self):
+        response = self.client.post('/contact/', {
+            'name': 'Ada',
+            'email': 'ada@example.com',
+            'subject': 'Hello',
+            'message': 'A question about a project.',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.subject, 'New Contact Message: Ada - Hello')
+        self.assertEqual(email.recipients, [settings.ADMIN_EMAIL])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_email_is_not_queued_when_the_transaction_rolls_back(self):
+        try:
+            with transaction.atomic():
+                outbox.enqueue('Subject', 'Body', ['a@example.com'])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_claimed_emails_are_hidden_until_the_lease_runs_out(self):
+        outbox.enqueue('Subject', 'Body', ['a@example.com'])
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+        self.assertEqual(outbox.claim_batch(10), [])
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+
+    def test_drain_sends_due_emails(self):
+        outbox.enqueue('Subject', 'Body', ['a@example.com'])
+        self.assertEqual(outbox.drain(), (1, 0))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='portfolio.tests.RejectingBackend')
+    def test_failed_send_is_retried_with_backoff(self):
+        outbox.enqueue('Subject', 'Body', ['a@example.com'])
+        before = timezone.now()
+        with self.assertLogs('portfolio', level='WARNING'):
+            self.assertEqual(outbox.drain(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'Recipient refused')
+        self.assertGreaterEqual(email.next_attempt_at, before + outbox.backoff(1))
+        # Not due again before the backoff.
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='portfolio.tests.UnreachableBackend')
+    def test_unreachable_server_counts_as_an_attempt(self):
+        outbox.enqueue('First', 'Body', ['a@example.com'])
+        outbox.enqueue('Second', 'Body', ['b@example.com'])
+        with self.assertLogs('portfolio', level='ERROR') as logs:
+            self.assertEqual(outbox.drain(), (0, 2))
+        self.assertIn('Could not connect to the mail server', logs.output[0])
+        for email in OutboxEmail.objects.all():
+            self.assertEqual(email.status, OutboxEmail.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.last_error, 'Connection refused')
+
+    @override_settings(EMAIL_BACKEND='portfolio.tests.UnreachableBackend')
+    def test_gives_up_after_max_attempts(self):
+        outbox.enqueue('Subject', 'Body', ['a@example.com'])
+        for attempt in range(3):
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('portfolio', level='WARNING'):
+                outbox.drain(max_attempts=3)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertEqual(email.attempts, 3)
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain(max_attempts=3), (0, 0))
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests')
+class DashboardTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for i, active in enumerate((True, True, False)):
+            GalleryImage.objects.create(
+                title=f'Photo {i}', is_active=active, image=jpeg(f'{i}.jpg', (64, 48), (i * 80, 0, 0)),
+            )
+        ProfileImage.objects.create(title='Portrait', image=jpeg('me.jpg', (64, 48), (0, 0, 255)))
+        for i in range(7):
+            self.message(f'Question {i}', is_responded=i % 3 == 0)
+
+    def message(self, subject, **fields):
+        return ContactMessage.objects.create(
+            name='Ada', email='ada@example.com', subject=subject, message='Hello.', **fields,
+        )
+
+    def stats(self):
+        return get_shared('dashboard', portfolio_admin_site.get_dashboard_stats, DASHBOARD_CACHE_TIMEOUT)
+
+    def test_aggregates_match_the_individual_queries(self):
+        stats = portfolio_admin_site.get_dashboard_stats()
+        self.assertEqual(stats['gallery_count'], GalleryImage.objects.count())
+        self.assertEqual(stats['active_gallery_count'], GalleryImage.objects.filter(is_active=True).count())
+        self.assertEqual(stats['profile_count'], ProfileImage.objects.count())
+        self.assertEqual(stats['active_profile_count'], ProfileImage.objects.filter(is_active=True).count())
+        self.assertEqual(stats['message_count'], ContactMessage.objects.filter(is_responded=False).count())
+        self.assertEqual(stats['recent_messages'], list(ContactMessage.objects.order_by('-created_at')[:5]))
+        for key, model in (
+            ('latest_gallery', GalleryImage), ('latest_profile', ProfileImage), ('latest_message', ContactMessage),
+        ):
+            self.assertEqual(stats[key], model.objects.order_by('-created_at').first().created_at, key)
+        self.assertEqual(
+            (stats['gallery_count'], stats['active_gallery_count'], stats['message_count']), (3, 2, 4),
+        )
+
+    def test_empty_tables(self):
+        GalleryImage.objects.all().delete()
+        ContactMessage.objects.all().delete()
+        stats = portfolio_admin_site.get_dashboard_stats()
+        self.assertEqual((stats['gallery_count'], stats['message_count']), (0, 0))
+        self.assertIsNone(stats['latest_gallery'])
+        self.assertEqual(stats['recent_messages'], [])
+
+    def test_saving_a_message_or_image_invalidates_the_dashboard(self):
+        self.assertEqual(self.stats()['message_count'], 4)
+        with self.assertNumQueries(0):
+            self.stats()
+
+        self.message('Another')
+        self.assertEqual(self.stats()['message_count'], 5)
+
+        image = GalleryImage.objects.get(title='Photo 0')
+        image.is_active = False
+        image.save()
+        self.assertEqual(self.stats()['active_gallery_count'], 1)
+
+    def test_index_shows_the_statistics(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/custom-admin/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['gallery_count'], 3)
+        self.assertEqual(response.context['message_count'], 4)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests', DEBUG=False)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def timing(self, response):
+        """Parse ``Server-Timing`` into ``{metric: {param: value}}``."""
+        metrics = {}
+        for entry in re.split(r', (?=\w+;)', response['Server-Timing']):
+            name, *params = entry.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_no_server_timing_for_anonymous_users(self):
+        response = self.client.get('/about/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='pw', is_staff=True))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/about/')
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'total', 'db', 'tpl', 'cache'})
+        self.assertEqual(timing['db']['desc'], f'"{len(context.captured_queries)} queries"')
+        self.assertGreater(float(timing['total']['dur']), 0)
+
+    def test_server_timing_for_everyone_under_debug(self):
+        with override_settings(DEBUG=True):
+            response = self.client.get('/about/')
+        self.assertIn('Server-Timing', response)
+
+    def test_counts_cache_hits_and_misses(self):
+        with self.assertLogs('portfolio.requests', level='INFO') as logs:
+            with override_settings(DEBUG=True):
+                cold = self.timing(self.client.get('/about/'))
+                warm = self.timing(self.client.get('/about/'))
+        self.assertRegex(cold['cache']['desc'], r'^"\d+ hits, [1-9]\d* misses"$')
+        self.assertEqual(warm['cache']['desc'], '"2 hits, 0 misses"')
+        self.assertEqual(warm['db']['desc'], '"0 queries"')
+
+        [first, second] = logs.output
+        self.assertIn('path=/about/ status=200', first)
+        self.assertIn('queries=0', second)
+        self.assertIn('cache_hits=2 cache_misses=0', second)
+
+
+class CacheCheckTests(TestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    FILES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+
+    def test_warns_about_a_per_process_cache_in_production(self):
+        with override_settings(DEBUG=False, CACHES=self.LOCMEM):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['portfolio.W001'])
+
+    def test_allows_a_per_process_cache_in_development(self):
+        with override_settings(DEBUG=True, CACHES=self.LOCMEM):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_allows_a_shared_cache(self):
+        with override_settings(DEBUG=False, CACHES=self.FILES):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+@override_settings(
+    ROOT_URLCONF='portfolio.tests',
+    PORTFOLIO_PAGE_CACHE=False,
+    PORTFOLIO_RATE_LIMITS={'ip': (2, 60 * 60), 'email': (1, 60 * 60)},
+    DEBUG=True,
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def contact(self, email='ada@example.com', ip='203.0.113.1'):
+        return self.client.post('/contact/', {
+            'name': 'Ada',
+            'email': email,
+            'subject': 'Hello',
+            'message': 'A question about a project.',
+        }, REMOTE_ADDR=ip)
+
+    def test_blocks_a_repeated_email_with_retry_after(self):
+        self.assertEqual(self.contact().status_code, 302)
+        with self.assertLogs('portfolio', level='WARNING'):
+            response = self.contact()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertLessEqual(int(response['Retry-After']), 60 * 60)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+    def test_email_limit_applies_across_addresses(self):
+        self.assertEqual(self.contact(ip='203.0.113.1').status_code, 302)
+        with self.assertLogs('portfolio', level='WARNING'):
+            self.assertEqual(self.contact(ip='203.0.113.2').status_code, 429)
+        self.assertEqual(self.contact(email='grace@example.com', ip='203.0.113.2').status_code, 302)
+
+    def test_ip_limit_applies_across_emails(self):
+        self.assertEqual(self.contact(email='a@example.com').status_code, 302)
+        self.assertEqual(self.contact(email='b@example.com').status_code, 302)
+        with self.assertLogs('portfolio', level='WARNING'):
+            self.assertEqual(self.contact(email='c@example.com').status_code, 429)
+        self.assertEqual(self.contact(email='c@example.com', ip='203.0.113.9').status_code, 302)
+
+    def test_refused_submission_does_not_use_up_the_other_bucket(self):
+        self.assertEqual(self.contact(email='a@example.com').status_code, 302)
+        with self.assertLogs('portfolio', level='WARNING'):
+            # Refused by email, so the IP keeps its second token.
+            self.assertEqual(self.contact(email='a@example.com').status_code, 429)
+        self.assertEqual(self.contact(email='b@example.com').status_code, 302)
+
+    def test_refused_submission_makes_no_queries(self):
+        self.assertEqual(self.contact().status_code, 302)
+        with self.assertLogs('portfolio', level='WARNING'), self.assertNumQueries(0):
+            self.assertEqual(self.contact().status_code, 429)
+
+    def test_idle_bucket_refills(self):
+        now = time.time()
+        self.assertEqual(self.contact().status_code, 302)
+        with mock.patch('portfolio.ratelimit.time') as clock:
+            clock.time.return_value = now + 2 * 60 * 60
+            self.assertEqual(self.contact().status_code, 302)
+
+    @override_settings(DEBUG=False, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'portfolio-ratelimit-test'),
+    }})
+    def test_fails_open_without_an_atomic_cache(self):
+        self.assertFalse(ratelimit.is_enabled())
+        for _ in range(3):
+            self.assertEqual(self.contact().status_code, 302)
+        self.assertEqual([e.id for e in check_rate_limit_cache(None)], ['portfolio.W002'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}})
+    def test_atomic_cache_passes_the_check(self):
+        self.assertTrue(ratelimit.is_enabled())
+        self.assertEqual(check_rate_limit_cache(None), [])
+
+    def test_counts_outcomes(self):
+        self.contact(email='a@example.com')
+        self.contact(email='b@example.com')
+        with self.assertLogs('portfolio', level='WARNING'):
+            self.contact(email='b@example.com', ip='203.0.113.2')
+            self.contact(email='c@example.com')
+        self.assertEqual(ratelimit.get_stats()['contact'], {'allowed': 2, 'rejected_ip': 1, 'rejected_email': 1})
+        ratelimit.reset_stats()
+        self.assertEqual(ratelimit.get_stats()['contact'], {'allowed': 0, 'rejected_ip': 0, 'rejected_email': 0})
+
+
+class ResponsiveImageTests(MediaRootMixin, TestCase):
+    TEMPLATE = Template(
+        '{% load portfolio_images %}'
+        '{% responsive_image image.image alt="Portrait" class="img-fluid" %}|{{ image.image|srcset }}'
+    )
+
+    def render(self, image):
+        return self.TEMPLATE.render(Context({'image': image}))
+
+    def test_offers_derivatives_once_written(self):
+        image = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        image.refresh_from_db()
+        tag, srcset = self.render(image).split('|')
+
+        self.assertTrue(tag.startswith('<picture>'))
+        self.assertIn('<source type="image/webp"', tag)
+        self.assertIn('width="800"', tag)
+        self.assertIn('height="600"', tag)
+        candidates = [candidate.split()[0] for candidate in srcset.split(', ')]
+        self.assertEqual(len(candidates), 3)
+        for url in candidates:
+            name = url[len(settings.MEDIA_URL):]
+            self.assertTrue(image.image.storage.derivative_storage.exists(name), name)
+
+    def assertPlainImage(self, image):
+        tag, srcset = self.render(image).split('|')
+        self.assertTrue(tag.startswith('<img '))
+        self.assertIn(f'src="{image.image.url}"', tag)
+        self.assertNotIn('srcset', tag)
+        self.assertNotIn('<source', tag)
+        self.assertIn('alt="Portrait"', tag)
+        self.assertEqual(srcset, '')
+
+    def test_plain_image_until_derivatives_are_written(self):
+        image = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        ProfileImage.objects.update(image_derivatives=False)
+        image.refresh_from_db()
+        self.assertEqual(image.image_width, 800)
+        self.assertPlainImage(image)
+
+    def test_failed_derivatives_are_not_offered(self):
+        with self.assertLogs('portfolio', level='ERROR'):
+            with mock.patch('portfolio.images.generate_derivatives', side_effect=OSError('Disk full')):
+                image = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        image.refresh_from_db()
+        self.assertEqual((image.image_width, image.image_derivatives), (800, False))
+        self.assertPlainImage(image)
+
+        with self.assertLogs('portfolio', level='ERROR'):
+            with mock.patch('portfolio.images.generate_derivatives', side_effect=OSError('Disk full')):
+                written, values = process_file('portfolio.ProfileImage', 'image', image.image.name)
+        self.assertIsNone(written)
+        self.assertEqual((values['image_width'], values['image_derivatives']), (800, False))
+
+    def test_original_size_is_written_once(self):
+        image = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        storage = image.image.storage.derivative_storage
+        for fmt in get_formats():
+            for width in (320, 640, 1024):
+                self.assertTrue(storage.exists(derivative_name(image.image.name, width, fmt)))
+            self.assertFalse(storage.exists(derivative_name(image.image.name, 1600, fmt)))
+        with Image.open(storage.open(derivative_name(image.image.name, 1024, 'jpeg'))) as copy:
+            self.assertEqual(copy.size, (800, 600))
+
+    def test_missing_last_derivative_is_regenerated(self):
+        image = ProfileImage.objects.create(title='Red', image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+        storage = image.image.storage.derivative_storage
+        self.assertEqual(generate_derivatives(image.image), 0)
+        storage.delete(derivative_name(image.image.name, 1024, 'jpeg'))
+        self.assertEqual(generate_derivatives(image.image), 3 * len(get_formats()))
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    def files(self, name):
+        """Return the original ``name`` and its derivatives that are on disk."""
+        directory, filename = os.path.split(media_storage().path(name))
+        stem = os.path.splitext(filename)[0]
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f for f in os.listdir(directory) if f.startswith(stem))
+
+    def red(self, title='Red'):
+        return ProfileImage.objects.create(title=title, image=jpeg('red.jpg', (800, 600), (255, 0, 0)))
+
+    def test_shared_file_is_deleted_with_its_last_row(self):
+        first, second = self.red('First'), self.red('Second')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+        self.assertGreater(len(self.files(name)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        self.assertIn(os.path.basename(name), self.files(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertEqual(self.files(name), [])
+
+    def test_rolled_back_delete_keeps_the_file(self):
+        image = self.red()
+        name = image.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    image.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        self.assertIn(os.path.basename(name), self.files(name))
+
+    def test_prune_media_removes_files_of_a_rolled_back_upload(self):
+        try:
+            with transaction.atomic():
+                name = self.red().image.name
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertGreater(len(self.files(name)), 1)
+        kept = ProfileImage.objects.create(title='Kept', image=jpeg('blue.jpg', (80, 60), (0, 0, 255))).image.name
+
+        call_command('prune_media', min_age=1, stdout=io.StringIO())
+        self.assertGreater(len(self.files(name)), 1)
+        call_command('prune_media', min_age=0, stdout=io.StringIO())
+        self.assertEqual(self.files(name), [])
+        self.assertIn(os.path.basename(kept), self.files(kept))
+
+    def test_files_from_before_content_addressing_are_not_deleted(self):
+        storage = media_storage()
+        name = storage.derivative_storage.save('profile/old.jpg', jpeg('old.jpg', (10, 10), (0, 0, 0)))
+        with self.captureOnCommitCallbacks(execute=True):
+            storage.delete(name)
+        self.assertTrue(storage.exists(name))
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests')
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.package = Package.objects.create(name='Portraits', description='A portrait session.')
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get('/packages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get('/packages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.client.get('/packages/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_saving_a_rendered_model_changes_the_etag(self):
+        etag = self.client.get('/packages/')['ETag']
+
+        self.package.name = 'Portrait Sessions'
+        self.package.save()
+
+        response = self.client.get('/packages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Portrait Sessions')
+
+    def test_deleting_a_rendered_model_changes_the_etag(self):
+        Package.objects.create(name='Events', description='Event coverage.')
+        etag = self.client.get('/packages/')['ETag']
+
+        self.package.delete()
+
+        response = self.client.get('/packages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests')
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_items(self, count, **fields):
+        items = [PortfolioItem.objects.create(title=f'Item {i}', **fields) for i in range(count)]
+        return [item.pk for item in items]
+
+    def walk(self, params):
+        """Follow the Next links from the first page, then the Previous links back."""
+        forward = []
+        response = self.client.get('/portfolio/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            forward.append([item.pk for item in response.context['portfolio_items']])
+            if 'next_page_query' not in response.context:
+                break
+            response = self.client.get(f"/portfolio/?{response.context['next_page_query']}")
+
+        backward = [forward[-1]]
+        while 'previous_page_query' in response.context:
+            response = self.client.get(f"/portfolio/?{response.context['previous_page_query']}")
+            self.assertEqual(response.status_code, 200)
+            backward.append([item.pk for item in response.context['portfolio_items']])
+        return forward, backward[::-1]
+
+    def test_cursors_round_trip(self):
+        pks = self.create_items(20)
+        forward, backward = self.walk({})
+        self.assertEqual([len(page) for page in forward], [9, 9, 2])
+        self.assertEqual(sum(forward, []), sorted(pks, reverse=True))
+        self.assertEqual(backward, forward)
+
+    def test_ties_on_created_at_are_ordered_by_id(self):
+        pks = self.create_items(20)
+        now = timezone.now()
+        # Two batches of rows sharing a timestamp, the older batch with the higher ids.
+        PortfolioItem.objects.filter(pk__in=pks[:10]).update(created_at=now)
+        PortfolioItem.objects.filter(pk__in=pks[10:]).update(created_at=now - timedelta(hours=1))
+        forward, backward = self.walk({})
+        expected = sorted(pks[:10], reverse=True) + sorted(pks[10:], reverse=True)
+        self.assertEqual(sum(forward, []), expected)
+        self.assertEqual(backward, forward)
+
+    def test_search_results_are_ordered_by_rank(self):
+        strong = PortfolioItem.objects.create(title='Sunset', description='Sunset over the sea.')
+        weak = PortfolioItem.objects.create(title='Beach', description='A beach at sunset.')
+        PortfolioItem.objects.create(title='Forest', description='Morning in the forest.')
+        ties = self.create_items(10, description='Golden sunset light.')
+
+        forward, backward = self.walk({'q': 'sunset'})
+        results = sum(forward, [])
+        self.assertEqual(results[0], strong.pk)
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[1:11], sorted(ties, reverse=True))
+        self.assertEqual(results[11], weak.pk)
+        self.assertEqual(backward, forward)
+
+    def test_invalid_cursors_are_not_found(self):
+        self.create_items(3)
+        cursors = [
+            'garbage!',
+            encode_cursor([1]),
+            encode_cursor(['not a date', 1]),
+            encode_cursor([timezone.now(), 'not an id']),
+            'bnVsbA',  # null
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor):
+                self.assertEqual(self.client.get('/portfolio/', {'cursor': cursor}).status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests')
+class NeighbourTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = [PortfolioItem.objects.create(title=f'Item {i}') for i in range(5)]
+
+    def neighbours(self, item):
+        response = self.client.get(item.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        previous, following = response.context['previous_item'], response.context['next_item']
+        return previous and previous.pk, following and following.pk
+
+    def walk(self):
+        """Follow the Next links from the newest item to the oldest."""
+        pks = []
+        item = PortfolioItem.objects.filter(published=True).order_by('-created_at', '-id').first()
+        while item is not None:
+            pks.append(item.pk)
+            item = self.client.get(item.get_absolute_url()).context['next_item']
+        return pks
+
+    def test_first_and_last_items(self):
+        newest, oldest = max(self.items, key=lambda item: item.pk), min(self.items, key=lambda item: item.pk)
+        self.assertIsNone(self.neighbours(newest)[0])
+        self.assertIsNone(self.neighbours(oldest)[1])
+        self.assertEqual(self.walk(), sorted((item.pk for item in self.items), reverse=True))
+
+    def test_ties_on_created_at_are_ordered_by_id(self):
+        pks = [item.pk for item in self.items]
+        now = timezone.now()
+        # The first three share a timestamp and are newer than the rest.
+        PortfolioItem.objects.filter(pk__in=pks[:3]).update(created_at=now)
+        PortfolioItem.objects.filter(pk__in=pks[3:]).update(created_at=now - timedelta(hours=1))
+        expected = sorted(pks[:3], reverse=True) + sorted(pks[3:], reverse=True)
+        self.assertEqual(self.walk(), expected)
+        middle = PortfolioItem.objects.get(pk=pks[1])
+        self.assertEqual(self.neighbours(middle), (pks[2], pks[0]))
+        # The oldest of the tied batch leads on to the newest of the older one.
+        self.assertEqual(self.neighbours(PortfolioItem.objects.get(pk=pks[0]))[1], pks[4])
+
+    def test_unpublished_items_are_skipped(self):
+        pks = [item.pk for item in self.items]
+        PortfolioItem.objects.filter(pk__in=[pks[1], pks[3]]).update(published=False)
+        self.assertEqual(self.walk(), [pks[4], pks[2], pks[0]])
+        self.assertEqual(self.neighbours(PortfolioItem.objects.get(pk=pks[2])), (pks[4], pks[0]))
+        hidden = PortfolioItem.objects.get(pk=pks[1])
+        self.assertEqual(self.client.get(hidden.get_absolute_url()).status_code, 404)
+
+
+class SearchIndexTests(TestCase):
+    def search(self, query):
+        return list(get_search_backend().search(PortfolioItem.objects.all(), query).values_list('pk', flat=True))
+
+    def test_index_follows_saves_and_deletes(self):
+        item = PortfolioItem.objects.create(title='Editorial shoot', description='Studio portraits in black and white.')
+        self.assertEqual(self.search('editorial'), [item.pk])
+        self.assertEqual(self.search('portraits'), [item.pk])
+        self.assertEqual(self.search('runway'), [])
+
+        item.title = 'Runway show'
+        item.description = 'Fashion week backstage.'
+        item.save()
+        self.assertEqual(self.search('runway'), [item.pk])
+        self.assertEqual(self.search('backstage'), [item.pk])
+        self.assertEqual(self.search('editorial'), [])
+        self.assertEqual(self.search('portraits'), [])
+
+        item.delete()
+        self.assertEqual(self.search('runway'), [])
+
+    def test_terms_match_as_prefixes_and_search_syntax_is_ignored(self):
+        item = PortfolioItem.objects.create(title='Photography', description='')
+        self.assertEqual(self.search('photo'), [item.pk])
+        self.assertEqual(self.search('photo "graphy'), [])
+
+
+@override_settings(PORTFOLIO_MEDIA_ACCEL='', PORTFOLIO_MEDIA_MAX_AGE=60 * 60)
+class MediaTests(MediaRootMixin, TestCase):
+    CONTENT = bytes(range(100))
+    CONTENT_NAME = f"content/ab/cd/{'ab' * 32}.bin"
+
+    def setUp(self):
+        super().setUp()
+        for name in ('gallery/file.bin', self.CONTENT_NAME, '.incoming/file.bin'):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.CONTENT)
+
+    def get(self, path='gallery/file.bin', **headers):
+        return serve_media(RequestFactory().get(f'/media/{path}', **headers), path)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_warns_when_production_streams_media_through_django(self):
+        with override_settings(DEBUG=False, PORTFOLIO_SERVE_MEDIA=True):
+            self.assertEqual([error.id for error in check_media_offload(None)], ['portfolio.W003'])
+        with override_settings(DEBUG=False, PORTFOLIO_SERVE_MEDIA=True, PORTFOLIO_MEDIA_ACCEL='x-sendfile'):
+            self.assertEqual(check_media_offload(None), [])
+        with override_settings(DEBUG=False, PORTFOLIO_SERVE_MEDIA=False):
+            self.assertEqual(check_media_offload(None), [])
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_byte_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.CONTENT[10:20])
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 95-99/100')
+        self.assertEqual(self.body(response), self.CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_content_addressed_files_are_immutable(self):
+        response = self.get(self.CONTENT_NAME)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_hidden_and_outside_paths_are_not_found(self):
+        paths = ('.incoming/file.bin', 'gallery/../.incoming/file.bin', '../settings.py', 'gallery/missing.bin', 'gallery')
+        for path in paths:
+            with self.subTest(path), self.assertRaises(Http404):
+                self.get(path)
+
+
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+    UPLOAD_ID = 'a' * 32
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        temp = override_settings(FILE_UPLOAD_TEMP_DIR=temp_dir)
+        temp.enable()
+        self.addCleanup(temp.disable)
+        self.photo = jpeg('photo.jpg', (400, 300), (0, 128, 255)).read()
+
+    def send(self, start, end, data=None, upload_id=UPLOAD_ID):
+        if data is None:
+            data = self.photo[start:end + 1]
+        return write_chunk(upload_id, f'bytes {start}-{end}/{len(self.photo)}', io.BytesIO(data))
+
+    def test_chunks_are_assembled_into_a_gallery_image(self):
+        middle = len(self.photo) // 2
+        self.assertEqual(self.send(0, middle - 1), middle)
+        self.assertEqual(self.send(middle, len(self.photo) - 1), len(self.photo))
+
+        [result] = complete_chunked_uploads([{'id': self.UPLOAD_ID, 'name': 'photo.jpg'}])
+        self.assertEqual(result['upload'], self.UPLOAD_ID)
+        image = GalleryImage.objects.get(pk=result['id'])
+        self.assertEqual((image.image_width, image.image_height), (400, 300))
+        self.assertTrue(image.image_derivatives)
+        self.assertFalse(os.path.exists(part_path(self.UPLOAD_ID)))
+
+    def test_rows_are_inserted_after_their_derivatives(self):
+        bulk_create = GalleryImage.objects.bulk_create
+
+        def insert(instances, *args, **kwargs):
+            for instance in instances:
+                self.assertTrue(instance.image_derivatives)
+                name = derivative_name(instance.image.name, 320, 'jpeg')
+                self.assertTrue(instance.image.storage.derivative_storage.exists(name), name)
+            return bulk_create(instances, *args, **kwargs)
+
+        with mock.patch.object(GalleryImage.objects, 'bulk_create', side_effect=insert) as patched:
+            [result] = create_gallery_images([('photo.jpg', io.BytesIO(self.photo))])
+        patched.assert_called_once()
+        self.assertIn('id', result)
+
+    def test_out_of_order_chunk_is_refused(self):
+        self.send(0, 99)
+        with self.assertRaisesMessage(UploadError, 'out of order'):
+            self.send(200, 299)
+        with self.assertRaisesMessage(UploadError, 'out of order'):
+            self.send(100, 199, upload_id='b' * 32)
+
+    def test_short_chunk_is_refused(self):
+        with self.assertRaisesMessage(UploadError, 'shorter'):
+            self.send(0, 99, data=self.photo[:50])
+
+    def test_missing_upload_is_reported(self):
+        [result] = complete_chunked_uploads([{'id': 'c' * 32, 'name': 'lost.jpg'}])
+        self.assertEqual(result, {'name': 'lost.jpg', 'upload': 'c' * 32, 'error': 'Upload was not received.'})
+
+    def test_malformed_completion_is_a_bad_request(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        url = reverse('admin:portfolio_galleryimage_bulk_upload_complete')
+        for body in ({'uploads': [1]}, {'uploads': ['x']}, {'uploads': 'x'}, {'uploads': None}, [1]):
+            with self.subTest(body):
+                response = self.client.post(url, json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(GalleryImage.objects.exists())
+
+    def test_abandoned_parts_are_swept(self):
+        self.send(0, 99)
+        self.send(0, 99, upload_id='d' * 32)
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(part_path(self.UPLOAD_ID), (old, old))
+
+        self.assertEqual(sweep_parts(), 1)
+        self.assertFalse(os.path.exists(part_path(self.UPLOAD_ID)))
+        self.assertTrue(os.path.exists(part_path('d' * 32)))
+
+
+class DuplicateUploadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.original = self.noise(1)
+        # Two bits from the original's perceptual hash.
+        self.near = self.original.copy()
+        ImageDraw.Draw(self.near).rectangle((0, 0, 120, 120), fill=(255, 255, 255))
+
+    def noise(self, seed):
+        """Return a photo-sized image of coarse grey noise, whose hash depends on ``seed``."""
+        rng = random.Random(seed)
+        image = Image.new('RGB', (64, 48))
+        image.putdata([(rng.randrange(256),) * 3 for _ in range(64 * 48)])
+        return image.resize((640, 480), Image.BICUBIC)
+
+    def upload(self, *images):
+        files = []
+        for index, image in enumerate(images):
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=90)
+            files.append((f'photo-{index}.jpg', SimpleUploadedFile(f'photo-{index}.jpg', buffer.getvalue())))
+        return create_gallery_images(files)
+
+    def test_near_duplicate_is_rejected(self):
+        [first] = self.upload(self.original)
+        [result] = self.upload(self.near)
+        self.assertEqual(result['error'], f'Looks like a duplicate of "{first["title"]}" (#{first["id"]}).')
+        self.assertEqual(GalleryImage.objects.count(), 1)
+
+    @override_settings(PORTFOLIO_DUPLICATE_ACTION='flag')
+    def test_near_duplicate_is_flagged(self):
+        [first] = self.upload(self.original)
+        [result] = self.upload(self.near)
+        self.assertEqual(result['duplicate_of'], first['id'])
+        self.assertEqual(GalleryImage.objects.get(pk=result['id']).duplicate_of_id, first['id'])
+
+    @override_settings(PORTFOLIO_DUPLICATE_ACTION='flag')
+    def test_repeat_within_an_upload_is_always_rejected(self):
+        first, second = self.upload(self.original, self.near)
+        self.assertIn('id', first)
+        self.assertEqual(second['error'], 'Looks like a duplicate of photo-0.jpg in this upload.')
+        self.assertEqual(GalleryImage.objects.count(), 1)
+
+    def test_different_photo_is_accepted(self):
+        self.upload(self.original)
+        [result] = self.upload(self.noise(2))
+        self.assertIn('id', result)
+        self.assertNotIn('duplicate_of', result)
+
+    @override_settings(PORTFOLIO_DUPLICATE_DISTANCE=1)
+    def test_photo_beyond_the_distance_is_accepted(self):
+        self.upload(self.original)
+        [result] = self.upload(self.near)
+        self.assertIn('id', result)
+        self.assertEqual(GalleryImage.objects.count(), 2)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests', PORTFOLIO_PAGE_CACHE=True)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def key(self, url, params=()):
+        return page_cache_key(RequestFactory().get(url), 1, params)
+
+    def test_unread_query_parameters_share_the_page(self):
+        self.assertEqual(self.key('/about/'), self.key('/about/?utm_source=newsletter&_=123'))
+        self.assertNotEqual(self.key('/about/'), self.key('/packages/'))
+
+    def test_read_query_parameters_are_keyed(self):
+        params = ('category', 'page')
+        self.assertNotEqual(self.key('/list/?page=1', params), self.key('/list/?page=2', params))
+        self.assertEqual(
+            self.key('/list/?page=2&category=a&ref=x', params),
+            self.key('/list/?category=a&page=2', params),
+        )
+
+    def test_tracking_tags_are_served_from_the_cache(self):
+        self.assertEqual(self.client.get('/about/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/about/', {'utm_source': 'newsletter'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='portfolio.tests', PORTFOLIO_SITE_DOMAIN='example.com')
+class SitemapTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = PortfolioItem.objects.create(title='Runway show')
+
+    def read_section(self, section):
+        with gzip.open(os.path.join(get_sitemap_dir(), f'sitemap-{section}-1.xml.gz')) as f:
+            return f.read().decode()
+
+    def test_build_writes_the_index_and_sections(self):
+        self.assertEqual(build(), {'pages': 4, 'portfolio': 1})
+        with open(os.path.join(get_sitemap_dir(), 'sitemap.xml')) as f:
+            index = f.read()
+        self.assertIn('https://example.com/sitemap-pages-1.xml.gz', index)
+        self.assertIn('https://example.com/sitemap-portfolio-1.xml.gz', index)
+        self.assertIn('<loc>https://example.com/about/</loc>', self.read_section('pages'))
+        self.assertIn(f'https://example.com/portfolio/{self.item.slug}/', self.read_section('portfolio'))
+
+    def test_changes_mark_sections_for_the_next_pending_build(self):
+        build()
+        with self.captureOnCommitCallbacks(execute=True):
+            PortfolioItem.objects.create(title='Editorial shoot', slug='editorial-shoot')
+        # Nothing is rebuilt during the save.
+        self.assertEqual(dirty_sections(), ['portfolio'])
+        self.assertNotIn('editorial-shoot', self.read_section('portfolio'))
+
+        out = io.StringIO()
+        call_command('build_sitemaps', pending=True, stdout=out)
+        self.assertIn('portfolio: 2 URLs', out.getvalue())
+        self.assertNotIn('pages', out.getvalue())
+        self.assertIn('editorial-shoot', self.read_section('portfolio'))
+        self.assertEqual(dirty_sections(), [])
+
+        out = io.StringIO()
+        call_command('build_sitemaps', pending=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'No sections to rebuild.')
+
+    def test_rolled_back_changes_mark_nothing(self):
+        build()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    PortfolioItem.objects.create(title='Editorial shoot')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(dirty_sections(), [])
+
+    def test_sitemap_view_serves_the_built_files(self):
+        self.assertEqual(self.client.get('/sitemap.xml').status_code, 404)
+        build()
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'sitemap-pages-1.xml.gz', b''.join(response.streaming_content))
+        response = self.client.get('/sitemap-pages-1.xml.gz')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'https://example.com/about/', gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(self.client.get('/sitemap-pages-2.xml.gz').status_code, 404)
+        self.assertEqual(self.client.get('/.dirty-pages').status_code, 404)
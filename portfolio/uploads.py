@@ -0,0 +1,275 @@
+"""
+Bulk gallery uploads.
+
+Photos reach the server either as one multipart POST, streamed to temporary
+files by ``TemporaryFileUploadHandler``, or in raw chunks that are appended
+straight to a part file on disk (``write_chunk``). Either way no photo is
+ever held in memory. Part files of uploads abandoned for ``PART_MAX_AGE``
+are swept away as new uploads start. ``create_gallery_images`` then
+validates and hashes the files on a thread pool, turns away (or flags)
+near-duplicates of the gallery and of each other, stores and processes the
+rest and inserts all rows with a single ``bulk_create``.
+"""
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+from . import duplicates
+from .images import perceptual_hash, process_image, set_image_metadata
+from .models import GalleryImage
+from .signals import invalidate_model_caches
+
+logger = logging.getLogger('portfolio')
+
+CHUNK_SIZE = 64 * 1024
+# Part files untouched for this long (seconds) belong to abandoned uploads.
+PART_MAX_AGE = 24 * 60 * 60
+MAX_FILE_SIZE = 50 * 1024 * 1024
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    pass
+
+
+def get_workers():
+    return getattr(settings, 'PORTFOLIO_UPLOAD_WORKERS', None) or min(8, (os.cpu_count() or 1) + 2)
+
+
+def part_dir():
+    directory = os.path.join(settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(), 'portfolio-uploads')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def part_path(upload_id):
+    """Return the temporary file a chunked upload is assembled in."""
+    if not isinstance(upload_id, str) or not UPLOAD_ID_RE.match(upload_id):
+        raise UploadError('Invalid upload id.')
+    return os.path.join(part_dir(), f'{upload_id}.part')
+
+
+def sweep_parts(max_age=PART_MAX_AGE):
+    """Delete the part files of chunked uploads untouched for ``max_age`` seconds. Returns how many."""
+    cutoff = time.time() - max_age
+    removed = 0
+    with os.scandir(part_dir()) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.part'):
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Completed or swept by another request meanwhile.
+                pass
+    if removed:
+        logger.info(f"Removed {removed} abandoned chunked uploads")
+    return removed
+
+
+def write_chunk(upload_id, content_range, stream):
+    """
+    Append one chunk read from ``stream`` to the upload's part file.
+
+    ``content_range`` is the request's ``Content-Range`` header, e.g.
+    ``bytes 0-1048575/5242880``. Returns the number of bytes received so far.
+    """
+    match = CONTENT_RANGE_RE.match(content_range or '')
+    if not match:
+        raise UploadError('Missing or invalid Content-Range header.')
+    start, end, total = (int(value) for value in match.groups())
+    if total > MAX_FILE_SIZE or end >= total or start > end:
+        raise UploadError('File is too large or the range is invalid.')
+
+    path = part_path(upload_id)
+    if start == 0:
+        sweep_parts()
+        mode = 'wb'
+    elif os.path.exists(path) and os.path.getsize(path) == start:
+        mode = 'ab'
+    else:
+        raise UploadError('Chunk received out of order.')
+
+    remaining = end - start + 1
+    with open(path, mode) as part:
+        while remaining:
+            data = stream.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            part.write(data)
+            remaining -= len(data)
+    if remaining:
+        raise UploadError('Chunk was shorter than its Content-Range.')
+    return end + 1
+
+
+def _check(file):
+    """Validate one photo and return its perceptual hash."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        raise UploadError('Not a valid image.')
+    if image_format not in ALLOWED_FORMATS:
+        raise UploadError(f'{image_format} images are not supported.')
+    file.seek(0)
+    try:
+        return perceptual_hash(file)
+    except Exception:
+        raise UploadError('Not a valid image.')
+    finally:
+        file.seek(0)
+
+
+def _store(file, filename, image_hash, duplicate_of=None):
+    """Save one validated photo to storage, returning an unsaved ``GalleryImage``."""
+    file.seek(0)
+    instance = GalleryImage(is_active=True, image_hash=image_hash, duplicate_of_id=duplicate_of)
+    instance.image.name = filename
+    instance.populate_defaults()
+
+    field = instance.image.field
+    name = field.generate_filename(instance, filename)
+    instance.image.name = field.storage.save(name, File(file, name=filename), max_length=field.max_length)
+    return instance
+
+
+def _match_duplicates(files, checked):
+    """
+    Return, for each checked file, ``None`` or the ``(pk, title)`` of the
+    photo it duplicates, where ``pk`` is ``None`` for an earlier file of the
+    same upload. The gallery's hashes are loaded into one BK-tree, which the
+    accepted files join as they go.
+    """
+    max_distance = duplicates.get_distance()
+    tree = duplicates.load_tree()
+    matches = []
+    for (filename, file), (image_hash, error) in zip(files, checked):
+        if error is not None:
+            matches.append(None)
+            continue
+        value = int(image_hash, 16)
+        match = tree.nearest(value, max_distance)
+        matches.append(match and match[1])
+        if match is None:
+            tree.add(value, (None, os.path.basename(filename)))
+    return matches
+
+
+def create_gallery_images(files):
+    """
+    Create gallery images from ``files``, a list of ``(filename, file)`` pairs.
+
+    Validation, hashing, metadata and derivative generation run
+    concurrently; storage, which may record references in the database
+    (see ``portfolio.storage``), stays on the calling thread. The rows are
+    inserted together once their derivatives are written. Near-duplicates of
+    existing photos are rejected or flagged according to
+    ``PORTFOLIO_DUPLICATE_ACTION``; repeats within the batch are always
+    rejected. Returns one result dict per file, in order, with either the
+    new image's ``id`` (and ``duplicate_of`` if flagged) or an ``error``.
+    """
+    action = duplicates.get_action()
+
+    def check(item):
+        filename, file = item
+        try:
+            return _check(file), None
+        except UploadError as e:
+            return None, str(e)
+
+    def store(filename, file, image_hash, match):
+        try:
+            instance = _store(file, os.path.basename(filename), image_hash, duplicate_of=match and match[0])
+        except OSError as e:
+            logger.error(f"Failed to store uploaded photo {filename}: {str(e)}")
+            return None, 'Could not save the file.'
+        return instance, None
+
+    def process(instance):
+        # bulk_create() bypasses the post_save signal, so run its work here,
+        # before the insert: no row exists without its derivatives, and the
+        # metadata goes in with the row instead of a second UPDATE per photo.
+        written = process_image(instance.image)
+        set_image_metadata(instance, 'image', fingerprint=False)
+        instance.image_derivatives = written is not None
+
+    with ThreadPoolExecutor(max_workers=get_workers()) as executor:
+        checked = list(executor.map(check, files))
+        # Matched here, on one thread, so files in the same batch see each other.
+        matches = _match_duplicates(files, checked)
+
+        stored = [(None, error) for image_hash, error in checked]
+        for index, ((image_hash, error), match) in enumerate(zip(checked, matches)):
+            if error is not None:
+                continue
+            if match is not None and (action == 'reject' or match[0] is None):
+                pk, title = match
+                if pk is None:
+                    stored[index] = (None, f'Looks like a duplicate of {title} in this upload.')
+                else:
+                    stored[index] = (None, duplicates.describe_duplicate(pk, title))
+                continue
+            stored[index] = store(*files[index], image_hash, match)
+
+        new_instances = [instance for instance, error in stored if instance is not None]
+        list(executor.map(process, new_instances))
+        instances = GalleryImage.objects.bulk_create(new_instances)
+
+    if instances:
+        invalidate_model_caches(GalleryImage)
+
+    results = []
+    for (filename, file), (instance, error) in zip(files, stored):
+        if instance is None:
+            results.append({'name': filename, 'error': error})
+        else:
+            result = {'name': filename, 'id': instance.pk, 'title': instance.title}
+            if instance.duplicate_of_id is not None:
+                result['duplicate_of'] = instance.duplicate_of_id
+            results.append(result)
+    return results
+
+
+def complete_chunked_uploads(uploads):
+    """
+    Turn finished chunked uploads into gallery images.
+
+    ``uploads`` is a list of ``{'id': upload_id, 'name': filename}`` dicts,
+    or ``UploadError`` is raised before anything is read; each result
+    carries its upload id as ``upload``. Part files are removed afterwards
+    whatever the outcome.
+    """
+    if not isinstance(uploads, list) or not all(isinstance(upload, dict) for upload in uploads):
+        raise UploadError('Expected a list of uploads.')
+    files, upload_ids, missing = [], [], []
+    try:
+        for upload in uploads:
+            name = str(upload.get('name') or 'photo')
+            try:
+                files.append((name, open(part_path(upload.get('id')), 'rb')))
+                upload_ids.append(upload['id'])
+            except (UploadError, OSError):
+                missing.append({'name': name, 'upload': upload.get('id'), 'error': 'Upload was not received.'})
+        results = create_gallery_images(files)
+    finally:
+        for name, file in files:
+            file.close()
+            os.remove(file.name)
+    for result, upload_id in zip(results, upload_ids):
+        result['upload'] = upload_id
+    return results + missing
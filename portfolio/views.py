@@ -3,52 +3,66 @@ from django.views.generic import ListView, DetailView, TemplateView
 from django.views.generic.edit import FormView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.static import serve
+from django.db import transaction
 from django.db.models import Q
 from .models import (
     PortfolioItem, PortfolioImage,
     Package, QuoteRequest,
-    ContactMessage, GalleryImage, ProfileImage, SiteSettings
+    ContactMessage, GalleryImage,
+    ProfileImage, SiteSettings
 )
 from .forms import QuoteRequestForm, ContactForm
+from .cache import (
+    ConditionalGetMixin, PageCacheMixin,
+    get_package_catalogue, get_profile_image, get_services, get_site_settings
+)
+from .search import get_search_backend
+from .sitemaps import get_sitemap_dir
+from .pagination import InvalidCursor, KeysetPaginator
+from .ratelimit import RateLimitMixin
+from . import outbox
+
+# Every page's layout shows the site settings and profile image.
+LAYOUT_MODELS = (SiteSettings, ProfileImage)
 
 
-class HomeView(TemplateView):
+class HomeView(ConditionalGetMixin, PageCacheMixin, TemplateView):
     """Home page view."""
     template_name = 'portfolio/home.html'
+    conditional_models = LAYOUT_MODELS + (GalleryImage,)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        site_settings = SiteSettings.objects.first()
-        
-        # Get profile image from site settings first, fallback to active profile image
-        profile_image = None
-        if site_settings and site_settings.main_profile_image:
-            profile_image = site_settings.main_profile_image
-        else:
-            profile_image = ProfileImage.objects.filter(is_active=True).first()
-            
         context.update({
             'gallery_images': GalleryImage.objects.filter(is_active=True).order_by('order'),
-            'profile_image': profile_image,
-            'site_settings': site_settings,
+            'profile_image': get_profile_image(),
+            'site_settings': get_site_settings(),
         })
         return context
 
 
-class PortfolioListView(ListView):
+class PortfolioListView(ConditionalGetMixin, ListView):
     """View for listing all portfolio items with filtering."""
     model = PortfolioItem
+    conditional_models = LAYOUT_MODELS + (PortfolioItem,)
     template_name = 'portfolio/portfolio_list.html'
     context_object_name = 'portfolio_items'
     paginate_by = 9
+    # Set to False to skip the COUNT(*) behind the "N projects" total.
+    count_total = True
+    
+    def get_ordering(self):
+        if self.request.GET.get('q'):
+            return ('-search_rank', '-created_at', '-id')
+        return ('-created_at', '-id')
     
     def get_queryset(self):
-        queryset = PortfolioItem.objects.filter(published=True).order_by('-created_at')
+        queryset = PortfolioItem.objects.filter(published=True)
         
         # Filter by category if provided
         category = self.request.GET.get('category')
@@ -58,28 +72,45 @@ class PortfolioListView(ListView):
         # Search functionality
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
+            queryset = get_search_backend().search(queryset, search_query)
             
-        return queryset
+        return queryset.order_by(*self.get_ordering())
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate by keyset cursor rather than page number, so deep pages stay cheap."""
+        paginator = KeysetPaginator(
+            queryset, page_size, ordering=self.get_ordering(), count_total=self.count_total
+        )
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid page.')
+        return (paginator, page, page.object_list, page.has_other_pages())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['active_category'] = self.request.GET.get('category', '')
         context['search_query'] = self.request.GET.get('q', '')
+        
+        page = context['page_obj']
+        if page is not None:
+            query = self.request.GET.copy()
+            for direction, cursor in (('next', page.next_cursor), ('previous', page.previous_cursor)):
+                if cursor:
+                    query['cursor'] = cursor
+                    context[f'{direction}_page_query'] = query.urlencode()
         return context
 
 
-class PortfolioDetailView(DetailView):
+class PortfolioDetailView(ConditionalGetMixin, DetailView):
     """View for displaying a single portfolio item."""
     model = PortfolioItem
+    conditional_models = LAYOUT_MODELS + (PortfolioItem, PortfolioImage)
     template_name = 'portfolio/portfolio_detail.html'
     context_object_name = 'portfolio_item'
     
     def get_queryset(self):
-        return PortfolioItem.objects.filter(published=True)
+        return PortfolioItem.objects.filter(published=True).prefetch_related('images')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -88,62 +119,55 @@ class PortfolioDetailView(DetailView):
             category=self.object.category
         ).exclude(pk=self.object.pk)[:3]
         
-        # Add navigation context
-        all_items = PortfolioItem.objects.filter(published=True).order_by('-created_at')
-        current_index = list(all_items.values_list('id', flat=True)).index(self.object.id)
-        
-        if current_index > 0:
-            context['previous_item'] = all_items[current_index - 1]
-        if current_index < len(all_items) - 1:
-            context['next_item'] = all_items[current_index + 1]
+        # Add navigation context: neighbours in the list's newest-first order,
+        # looked up by keyset on (created_at, id) so the cost doesn't grow
+        # with the catalogue.
+        published = PortfolioItem.objects.filter(published=True)
+        created_at, pk = self.object.created_at, self.object.pk
+        context['previous_item'] = published.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by('created_at', 'id').first()
+        context['next_item'] = published.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        ).order_by('-created_at', '-id').first()
             
         return context
 
 
-class AboutView(TemplateView):
+class AboutView(ConditionalGetMixin, PageCacheMixin, TemplateView):
     """About page view."""
     template_name = 'portfolio/about.html'
+    conditional_models = LAYOUT_MODELS
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        site_settings = SiteSettings.objects.first()
-        
-        # Get profile image from site settings first, fallback to active profile image
-        profile_image = None
-        if site_settings and site_settings.main_profile_image:
-            profile_image = site_settings.main_profile_image
-        else:
-            profile_image = ProfileImage.objects.filter(is_active=True).first()
-            
-        context['profile_image'] = profile_image
+        context['profile_image'] = get_profile_image()
         return context
 
 
-class PackageListView(ListView):
+class PackageListView(ConditionalGetMixin, PageCacheMixin, ListView):
     """View for listing all packages."""
     model = Package
+    conditional_models = LAYOUT_MODELS + (Package,)
     template_name = 'portfolio/packages.html'
     context_object_name = 'packages'
     
     def get_queryset(self):
-        return Package.objects.filter(is_active=True)
+        self.catalogue = get_package_catalogue()
+        return [package for group in self.catalogue for package in group['packages']]
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['digital_packages'] = Package.objects.filter(
-            category='digital',
-            is_active=True
-        )
-        context['modelling_packages'] = Package.objects.filter(
-            category='modelling',
-            is_active=True
-        )
+        context['catalogue'] = self.catalogue
+        for group in self.catalogue:
+            context[f"{group['category']}_packages"] = group['packages']
         context['form'] = QuoteRequestForm()
         return context
 
 
-class QuoteRequestView(FormView):
+class QuoteRequestView(RateLimitMixin, FormView):
     """View for handling quote request submissions."""
+    rate_limit_scope = 'quote'
     form_class = QuoteRequestForm
     template_name = 'portfolio/packages.html'
     success_url = reverse_lazy('packages')
@@ -156,12 +180,11 @@ class QuoteRequestView(FormView):
         quote = form.save(commit=False)
         if package:
             quote.package = package
-        quote.save()
         
-        # Send email notification
-        try:
-            subject = f'New Quote Request: {quote.name} - {package.name if package else "General Enquiry"}'
-            message = f'''
+        # Queue the email notification with the quote; the send_outbox
+        # worker delivers it, so the response never waits on SMTP.
+        subject = f'New Quote Request: {quote.name} - {package.name if package else "General Enquiry"}'
+        message = f'''
             Name: {quote.name}
             Email: {quote.email}
             Phone: {quote.phone or 'Not provided'}
@@ -170,19 +193,9 @@ class QuoteRequestView(FormView):
             Message:
             {quote.message}
             '''
-            
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[settings.ADMIN_EMAIL],
-                fail_silently=False,
-            )
-        except Exception as e:
-            import logging
-            logger = logging.getLogger('portfolio')
-            logger.error(f"Failed to send quote request email: {str(e)}")
-            # Don't fail the form submission if email fails
+        with transaction.atomic():
+            quote.save()
+            outbox.enqueue(subject, message, [settings.ADMIN_EMAIL])
         
         messages.success(
             self.request,
@@ -198,18 +211,33 @@ class QuoteRequestView(FormView):
         return super().form_invalid(form)
 
 
-class ContactView(FormView):
+class ContactView(RateLimitMixin, FormView):
     """Contact page view."""
+    rate_limit_scope = 'contact'
     template_name = 'portfolio/contact.html'
     form_class = ContactForm
     success_url = reverse_lazy('contact')
 
     def form_valid(self, form):
         try:
-            # Save the contact message to the database
+            # Save the contact message to the database and queue the notification
             message = form.save(commit=False)
             message.is_responded = False  # Set initial status
-            message.save()
+            with transaction.atomic():
+                message.save()
+                outbox.enqueue(
+                    f'New Contact Message: {message.name} - {message.subject}',
+                    f'''
+            Name: {message.name}
+            Email: {message.email}
+            Phone: {message.phone or 'Not provided'}
+            Service: {get_services().get(message.service_interest, message.service_interest) or 'Not specified'}
+            
+            Message:
+            {message.message}
+            ''',
+                    [settings.ADMIN_EMAIL],
+                )
             
             # Debug logging
             import logging
@@ -249,6 +277,14 @@ class ContactView(FormView):
         return super().form_invalid(form)
 
 
+def sitemap_view(request, filename='sitemap.xml'):
+    """
+    Serve a prebuilt sitemap file. Sitemaps are never rendered on request;
+    see ``portfolio.sitemaps``.
+    """
+    return serve(request, filename, document_root=get_sitemap_dir())
+
+
 def custom_404_view(request, exception):
     """Custom 404 error page."""
     return render(request, '404.html', status=404)
@@ -176,4 +176,18 @@ document.addEventListener('DOMContentLoaded', function() {
             window.addEventListener('orientationchange', lazyLoad);
         }
     }
+
+    // Drop the inline blurred placeholder once the real image has loaded
+    document.querySelectorAll('img.lqip').forEach(function(img) {
+        const clearPlaceholder = function() {
+            img.style.backgroundImage = '';
+            img.style.backgroundColor = '';
+            img.classList.remove('lqip');
+        };
+        if (img.complete && img.naturalWidth) {
+            clearPlaceholder();
+        } else {
+            img.addEventListener('load', clearPlaceholder, { once: true });
+        }
+    });
 });